@@ -0,0 +1,59 @@
+# Code/access_log.py
+# Last-access times for on-disk index artefacts (documents in the shared index, exact
+# indexes), persisted as JSON so the garbage collector can evict least-recently-used ones.
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+class AccessLog:
+    """{kind: {key: last_access_epoch}} with atomic writes; thread-safe."""
+
+    def __init__(self, path: Path, flush_interval_seconds: float = 30.0) -> None:
+        self.path = Path(path)
+        self.flush_interval_seconds = flush_interval_seconds
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        try:
+            self._data: Dict[str, Dict[str, float]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self._data = {}
+
+    def touch(self, kind: str, keys: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            bucket = self._data.setdefault(kind, {})
+            for k in keys:
+                bucket[k] = now
+            # a busy server touches constantly: persist at most every flush_interval_seconds
+            if now - self._last_flush >= self.flush_interval_seconds:
+                self._flush()
+
+    def forget(self, kind: str, keys: Iterable[str]) -> None:
+        with self._lock:
+            bucket = self._data.get(kind, {})
+            for k in keys:
+                bucket.pop(k, None)
+            self._flush()
+
+    def last_access(self, kind: str, key: str) -> Optional[float]:
+        with self._lock:
+            return self._data.get(kind, {}).get(key)
+
+    def snapshot(self, kind: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._data.get(kind, {}))
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._data), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._last_flush = time.time()
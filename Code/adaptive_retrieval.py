@@ -0,0 +1,91 @@
+# Code/adaptive_retrieval.py
+# Adaptive retrieval: pick the candidate depth from the dense-score distribution, then
+# rerank in stages and stop once a stage no longer changes the top_n.
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# process-wide counters: how much cross-encoder work adaptive mode actually did
+ADAPTIVE_STATS: Counter = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def choose_depth(sims: List[float], min_k: int, gap_threshold: float, max_drop: float) -> int:
+    """
+    Candidate depth from descending similarity scores: cut at the first large gap
+    (>= gap_threshold) or once scores fall more than max_drop below the best hit,
+    but never below min_k.
+    """
+    if len(sims) <= min_k:
+        return len(sims)
+    for i in range(min_k, len(sims)):
+        if sims[i - 1] - sims[i] >= gap_threshold or sims[0] - sims[i] > max_drop:
+            return i
+    return len(sims)
+
+
+def adaptive_stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        stats = dict(ADAPTIVE_STATS)
+    full = stats.get("pairs_full", 0)
+    stats["rerank_work_ratio"] = round(stats.get("pairs_scored", 0) / full, 3) if full else None
+    return stats
+
+
+class AdaptiveRerankRetriever(BaseRetriever):
+    """
+    Dense search (up to max_k) -> adaptive depth -> staged cross-encoder reranking -> top_n.
+
+    The first stage scores top_n + stage_size candidates; each further stage adds stage_size.
+    If no candidate from the newest stage makes it into the top_n, deeper (lower dense score)
+    candidates are very unlikely to either, so reranking stops there.
+    """
+
+    vectorstore: Any
+    cross_encoder: Any
+    top_n: int = 5
+    max_k: int = 20
+    stage_size: int = 5
+    gap_threshold: float = 0.08
+    max_drop: float = 0.25
+    search_filter: Optional[Dict[str, Any]] = None
+    # optional section_router.SectionRouter: narrows search_filter to the sections a query is about
+    router: Any = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        search_filter = self.router.filter_for(query, self.search_filter) if self.router else self.search_filter
+        hits: List[Tuple[Document, float]] = self.vectorstore.similarity_search_with_relevance_scores(
+            query, k=self.max_k, filter=search_filter
+        )
+        if not hits:
+            return []
+        hits.sort(key=lambda h: h[1], reverse=True)
+        depth = choose_depth([s for _, s in hits], self.top_n, self.gap_threshold, self.max_drop)
+        candidates = [d for d, _ in hits[:depth]]
+
+        scored: List[Tuple[float, int]] = []
+        end = 0
+        while end < len(candidates):
+            start, end = end, min(len(candidates), (end or self.top_n) + self.stage_size)
+            stage = candidates[start:end]
+            scores = self.cross_encoder.score([(query, d.page_content) for d in stage])
+            before = {i for _, i in sorted(scored, reverse=True)[:self.top_n]}
+            scored.extend((s, start + j) for j, s in enumerate(scores))
+            after = {i for _, i in sorted(scored, reverse=True)[:self.top_n]}
+            # top_n stable: the newest stage contributed nothing
+            if start > 0 and after == before:
+                break
+
+        with _STATS_LOCK:
+            ADAPTIVE_STATS["queries"] += 1
+            ADAPTIVE_STATS["pairs_scored"] += len(scored)
+            ADAPTIVE_STATS["pairs_full"] += len(hits)
+            ADAPTIVE_STATS["depth_total"] += depth
+
+        return [candidates[i] for _, i in sorted(scored, reverse=True)[:self.top_n]]
@@ -1,13 +1,62 @@
 # Code/api.py
 # Run: uvicorn Code.api:app --reload --host 127.0.0.1 --port 8000
-from fastapi import FastAPI, UploadFile, File, Form
+import threading
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
-from typing import List, Optional
-from .mcp_server import create_session, ask
+from typing import Any, Dict, List, Optional
+from .mcp_server import SESSIONS, create_session, ask, close_session, wait_for_session
+from .gc_index import collect_garbage, start_gc_thread
+from .model_registry import MODEL_REGISTRY
+from .pdf_to_markdown import MAX_PDF_WORKERS, warm_converter
+from .vectorize import RERANK_BATCHER, pool_stats, warm_reranker
+from .adaptive_retrieval import adaptive_stats
+from .query_cache import query_cache_stats
 
 
 app = FastAPI(title="BI Agent API", version="1.1")
 
+# background garbage collection of indexes / uploads (see gc_index.py)
+GC_INTERVAL_SECONDS = 6 * 3600
+GC_INDEX_BUDGET_MB = 2048
+GC_EXACT_BUDGET_MB = 512
+
+
+@app.on_event("startup")
+def warm_models() -> None:
+    # warm in the background so the API is reachable immediately;
+    # a request that needs the converter meanwhile just waits on the registry lock
+    threading.Thread(target=warm_converter, name="warm-converter", daemon=True).start()
+    threading.Thread(target=warm_reranker, name="warm-reranker", daemon=True).start()
+    start_gc_thread(
+        lambda: list(SESSIONS),
+        interval_seconds=GC_INTERVAL_SECONDS,
+        index_budget_mb=GC_INDEX_BUDGET_MB,
+        exact_budget_mb=GC_EXACT_BUDGET_MB,
+    )
+
+
+@app.get("/stats")
+def stats() -> Dict[str, Any]:
+    """Model load status, first-load timings and memory; reranker batching, query cache and open index metrics."""
+    return {
+        **MODEL_REGISTRY.stats(),
+        "reranker": RERANK_BATCHER.stats(),
+        "adaptive_rerank": adaptive_stats(),
+        "query_cache": query_cache_stats(),
+        "pools": pool_stats(),
+    }
+
+
+@app.get("/gc")
+def gc_report() -> Dict[str, Any]:
+    """Dry run of the garbage collector: what the next scheduled pass would delete."""
+    return collect_garbage(
+        live_sessions=list(SESSIONS),
+        dry_run=True,
+        index_budget_mb=GC_INDEX_BUDGET_MB,
+        exact_budget_mb=GC_EXACT_BUDGET_MB,
+    )
+
 
 class QueryResponse(BaseModel):
     final_answer: str
@@ -23,6 +72,7 @@ def query_agent(
     customers_csv: UploadFile = File(...),
     tickets_csv: UploadFile = File(...),
     pdf_files: List[UploadFile] = File(default=[]),
+    pdf_workers: int = Form(1, ge=1, le=MAX_PDF_WORKERS),
 ) -> QueryResponse:
     # Reset file pointers BEFORE reading bytes
     customers_csv.file.seek(0)
@@ -40,14 +90,23 @@ def query_agent(
         customers_csv_bytes=customers_csv.file.read(),
         tickets_csv_bytes=tickets_csv.file.read(),
         pdf_files=pdf_payload,        # <- send name+bytes
+        pdf_workers=pdf_workers,
     )
 
     session_id = session["session_id"]
+    # one-shot endpoint: wait for the background ingestion before asking
+    wait_for_session(session_id)
     # Ask MCP
     result = ask(
         session_id=session_id,
         question=question,
     )
+    # one session per request: free its uploads right away
+    close_session(session_id)
+    if "error" in result:
+        # e.g. SQL_INGESTION_FAILED / DOCS_INGESTION_FAILED: not an empty answer
+        status = 503 if result["error"] == "SESSION_NOT_READY" else 500
+        raise HTTPException(status_code=status, detail=result)
 
     return QueryResponse(
     final_answer=result.get("final_answer", ""),
@@ -1,10 +1,12 @@
 # implementation of app.py using langgraph with Invisible Reflection Hints
 import os
 from duckdb import df
-from .ingestion import ingest_files
+from .ingestion import ingest_files, ingest_pdfs
 from .sql_engine import load_two_csvs_to_duckdb
-from .pdf_to_markdown import pdfs_to_markdown
 from .vectorize import build_retriever
+from .hashing import file_sha256
+from .pdf_to_markdown import STREAM_WINDOW_PAGES
+from .chunk_dedup import merge_overlapping
 from .sql_orchestrator import should_run_sql
 from .summarization_agent import summarize_with_llama
 from .llm_sql_agent import sql_pipeline_structured
@@ -103,6 +105,12 @@ def retrieve_docs(state: AppState) -> AppState:
     md_to_pdf = state.get("md_to_pdf", {})
     sources = []
     for c in chunks:
+        # chunks are shared across sessions by content: their source/filename are the
+        # first uploader's, so name them from this session's doc_hash entry when present
+        own_name = md_to_pdf.get(c.metadata.get("doc_hash", ""))
+        if own_name:
+            sources.append(own_name)
+            continue
         raw_source = c.metadata.get("source", "Unknown")
         md_name = os.path.basename(raw_source)
 
@@ -115,7 +123,8 @@ def retrieve_docs(state: AppState) -> AppState:
     unique_sources = sorted(set(sources))
     source_str = f"Reference: {', '.join(unique_sources)}" if unique_sources else "Reference: None"
 
-    doc_evidence = "\n".join(c.page_content for c in chunks) if chunks else ""
+    # neighbouring chunks share splitter overlap: stitch them so no text appears twice
+    doc_evidence = "\n".join(merge_overlapping(chunks)) if chunks else ""
     doc_evidence_with_sources = f"{doc_evidence}\n\n{source_str}"
     print(f"[Langraph] Retrieved chunks: {len(chunks) if chunks else 0}")
     print(f"\ntype_schema: {state['type_schema']}")
@@ -257,7 +266,8 @@ def build_runtime() ->   Tuple[Any, Any, str, Dict[str, Any], List[str], Dict[st
         r"/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/pdfs/Shipping_Delivery_Policy.pdf",r'/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/csv/customers.csv',r'/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/csv/tickets.csv'
 
     ]
-    csv_paths, pdf_paths = ingest_files(paths)
+    # PDFs are validated during the single Docling pass below
+    csv_paths, pdf_paths = ingest_files(paths, validate_pdfs=False)
 
     customers_csv = next(p for p in csv_paths if "customer" in p.lower())
     tickets_csv   = next(p for p in csv_paths if "ticket" in p.lower())
@@ -272,12 +282,15 @@ def build_runtime() ->   Tuple[Any, Any, str, Dict[str, Any], List[str], Dict[st
     table_name = table_names["view"]
     type_schema = schemas["view"]
 
-    paths_md, errors_md, is_md, md_to_pdf = pdfs_to_markdown(pdf_paths, r"/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/docs/")
+    paths_md, errors_md, is_md, md_to_pdf, pdf_reports = ingest_pdfs(pdf_paths, r"/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/docs/")
+    if not is_md:
+        raise ValueError(f"No usable PDFs found. Errors: {errors_md}")
     retriever = build_retriever(paths_md)
 
     return retriever, con, table_name, type_schema, warnings, md_to_pdf
 
-def build_runtime_from_paths(customers_csv: str, tickets_csv: str, pdf_paths: List[str], doc_dir: str):
+# The two runtime halves are independent, so sessions can build them in parallel
+def build_sql_runtime(customers_csv: str, tickets_csv: str) -> Tuple[Any, str, Dict[str, Any], List[str]]:
     con, table_names, schemas, warnings = load_two_csvs_to_duckdb(
         customers_csv_path=customers_csv,
         tickets_csv_path=tickets_csv,
@@ -287,9 +300,27 @@ def build_runtime_from_paths(customers_csv: str, tickets_csv: str, pdf_paths: Li
 
     table_name = table_names["view"]
     type_schema = schemas["view"]
-
-    paths_md, errors_md, is_md, md_to_pdf = pdfs_to_markdown(pdf_paths, doc_dir)
+    return con, table_name, type_schema, warnings
+
+def build_docs_runtime(pdf_paths: List[str], doc_dir: str, pdf_workers: int = 1, on_stage=None) -> Tuple[Any, Dict[str, str]]:
+    # on_stage(name) lets callers track progress: "converting" -> "indexing"
+    if on_stage:
+        on_stage("converting")
+    paths_md, errors_md, is_md, md_to_pdf, pdf_reports = ingest_pdfs(
+        pdf_paths, doc_dir, workers=pdf_workers, stream_window_pages=STREAM_WINDOW_PAGES,
+    )
+    if on_stage:
+        on_stage("indexing")
     retriever = build_retriever(paths_md) if paths_md else None
+    # also key by content hash: retrieve_docs names shared chunks after this session's upload
+    for p in paths_md:
+        md_name = os.path.basename(str(p))
+        md_to_pdf[file_sha256(p)] = md_to_pdf.get(md_name, md_name)
+    return retriever, md_to_pdf
+
+def build_runtime_from_paths(customers_csv: str, tickets_csv: str, pdf_paths: List[str], doc_dir: str, pdf_workers: int = 1):
+    con, table_name, type_schema, warnings = build_sql_runtime(customers_csv, tickets_csv)
+    retriever, md_to_pdf = build_docs_runtime(pdf_paths, doc_dir, pdf_workers=pdf_workers)
 
     return retriever, con, table_name, type_schema, warnings, md_to_pdf
 
@@ -0,0 +1,109 @@
+# Code/bench_normalize.py
+# Micro-benchmark + equivalence check: Code/text_normalize vs the original per-call regex code.
+# Run: python -m Code.bench_normalize [--mb 8] [--repeat 3]
+import argparse
+import random
+import re
+import time
+
+from . import text_normalize
+
+
+# --- reference implementations (the code text_normalize replaced) ---------------
+def legacy_clean_markdown(md_text: str) -> str:
+    text = md_text.replace(r"\_", "_")
+    text = text.replace("×", "*")
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = re.sub(r"\s+([,.;:!?])", r"\1", text)
+    text = re.sub(r'([:.!?])([a-zA-Z])', r'\1 \2', text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def legacy_sanitize_text(text: str) -> str:
+    text = re.sub(r'([:.!?])([a-zA-Z])', r'\1 \2', text)
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'([a-zA-Z])([=*])', r'\1 \2', text)
+    text = re.sub(r'([=*])([a-zA-Z])', r'\1 \2', text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def legacy_fix_md_headers(text: str) -> str:
+    text = re.sub(r'^[ \t]+#', '#', text, flags=re.MULTILINE)
+    text = re.sub(r'(##+)', r'\n\1', text)
+    return re.sub(r'^(#+)([^#\s])', r'\1 \2', text, flags=re.MULTILINE)
+
+
+def legacy_pipeline(md: str) -> str:
+    return legacy_fix_md_headers(legacy_sanitize_text(legacy_clean_markdown(md)))
+
+
+def compiled_pipeline(md: str) -> str:
+    return text_normalize.fix_md_headers(text_normalize.sanitize_text(text_normalize.clean_markdown(md)))
+
+
+# --- inputs -------------------------------------------------------------------
+_SAMPLE = (
+    "## 3.Delivery  Timeframes\n  ### Domestic\tshipments typically arrive within three (3) to seven (7)"
+    " business days .Customerchurn   is low.\n\n\n\nRevenue=Price×Qty and sale\\_id*2 !Next  \t\n"
+    "- item one ,item two ;item three:Done\n#Header\n"
+)
+_ALPHABET = "aAbZz  \t\t\n\n.,;:!?=*#×\\_-019()'"
+
+
+def make_document(n_chars: int, seed: int = 0) -> str:
+    """Realistic Markdown repeated to size, with random noise lines mixed in."""
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < n_chars:
+        block = _SAMPLE if rng.random() < 0.7 else "".join(rng.choice(_ALPHABET) for _ in range(200))
+        parts.append(block)
+        size += len(block)
+    return "".join(parts)
+
+
+def check_equivalence(cases: int = 2000, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    for _ in range(cases):
+        s = "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 80)))
+        assert text_normalize.clean_markdown(s) == legacy_clean_markdown(s), repr(s)
+        assert text_normalize.sanitize_text(s) == legacy_sanitize_text(s), repr(s)
+        assert text_normalize.fix_md_headers(s) == legacy_fix_md_headers(s), repr(s)
+
+
+def _best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text normalization.")
+    parser.add_argument("--mb", type=float, default=8.0, help="document size in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    check_equivalence()
+    doc = make_document(int(args.mb * 1024 * 1024))
+    assert compiled_pipeline(doc) == legacy_pipeline(doc)
+    print(f"equivalence: OK ({len(doc) / 1e6:.1f}M chars)")
+
+    rows = [
+        ("clean_markdown", legacy_clean_markdown, text_normalize.clean_markdown, doc),
+        ("sanitize_text", legacy_sanitize_text, text_normalize.sanitize_text, doc),
+        ("fix_md_headers", legacy_fix_md_headers, text_normalize.fix_md_headers, legacy_sanitize_text(doc)),
+        ("full pipeline", legacy_pipeline, compiled_pipeline, doc),
+    ]
+    for name, old, new, arg in rows:
+        t_old = _best_of(old, arg, args.repeat)
+        t_new = _best_of(new, arg, args.repeat)
+        print(f"{name:<16} legacy {t_old * 1000:8.1f} ms   compiled {t_new * 1000:8.1f} ms   x{t_old / t_new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
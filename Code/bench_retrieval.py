@@ -0,0 +1,295 @@
+# Code/bench_retrieval.py
+# Retrieval quality + latency benchmark over Data/pdfs.
+# Builds the index with the real ingestion/chunking pipeline but a deterministic local
+# embedder (HashingEmbeddings) instead of Ollama, then queries the same retriever a session
+# gets (vectorize._make_retriever: section routing, fixed or adaptive reranking) with the
+# labelled queries in Data/bench/queries.json. Reports recall@k / MRR for plain dense search
+# and for the retriever's final top 5, plus p50/p95 latency of both. For the exact backend
+# with --quantization int8 it also reports resident vector memory vs float32 and how often
+# the quantized top-k matches the float32 top-k. Results go to JSON; with
+# --baseline the run fails (exit 1) when quality drops or latency grows past the thresholds.
+# Run: python -m Code.bench_retrieval [--backend exact|chroma] [--quantization none|int8] [--route]
+#                                     [--mode fixed|adaptive] [--no-rerank]
+#      python -m Code.bench_retrieval --out new.json --baseline old.json --max-recall-drop 0.02
+import argparse
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .adaptive_retrieval import adaptive_stats
+from .chunk_dedup import dedup_chunks
+from .exact_index import ExactIndex, ExactVectorStore
+from .pdf_to_markdown import convert_pdfs
+from .vectorize import COLLECTION, _make_retriever, _section_router, cap_chunk_size, load_md_documents, split_by_md
+
+ROOT = Path(__file__).resolve().parent.parent
+PDF_DIR = ROOT / "Data" / "pdfs"
+QUERIES_PATH = ROOT / "Data" / "bench" / "queries.json"
+KS = (1, 3, 5, 20)
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic stand-in for Ollama: hashed unigram + bigram counts, L2-normalised."""
+
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        words = _TOKEN.findall(text.lower())
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) == 0 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def is_relevant(chunk: Document, query: Dict[str, Any]) -> bool:
+    """Chunk comes from the labelled document and contains one of the answer spans."""
+    if chunk.metadata.get("doc_id") != query["doc_id"]:
+        return False
+    text = _norm(chunk.page_content)
+    return any(_norm(a) in text for a in query["answer"])
+
+
+def quality(ranked: Sequence[Sequence[bool]], ks: Sequence[int] = KS) -> Dict[str, float]:
+    """recall@k (share of queries with a relevant chunk in the top k) and MRR."""
+    out: Dict[str, float] = {}
+    n = max(len(ranked), 1)
+    for k in ks:
+        out[f"recall@{k}"] = round(sum(any(r[:k]) for r in ranked) / n, 4)
+    out["mrr"] = round(sum(next((1.0 / (i + 1) for i, rel in enumerate(r) if rel), 0.0) for r in ranked) / n, 4)
+    return out
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"p50": None, "p95": None}
+    return {"p50": round(float(np.percentile(samples_ms, 50)), 3), "p95": round(float(np.percentile(samples_ms, 95)), 3)}
+
+
+def build_chunks(pdf_dir: Path, work_dir: Path) -> List[Document]:
+    """Same path as a session: Docling (md cache) -> sanitize -> header split -> cap -> dedup."""
+    pdfs = sorted(str(p) for p in pdf_dir.glob("*.pdf"))
+    records = convert_pdfs(pdfs, work_dir / "md")
+    md_paths = [str(r["md_path"]) for r in records if r["ok"]]
+    chunks = cap_chunk_size(split_by_md(load_md_documents(md_paths)))
+    chunks, _ = dedup_chunks(chunks)
+    return chunks
+
+
+class _ExactBackend:
+    def __init__(self, chunks: List[Document], embeddings: Embeddings, root: Path, quantization: str = "none") -> None:
+        ids = [f"c{i}" for i in range(len(chunks))]
+        vectors = embeddings.embed_documents([c.page_content for c in chunks])
+        # float32 reference index (also what "none" searches)
+        self.reference = ExactIndex.build(root, ids, [c.page_content for c in chunks], [c.metadata for c in chunks], vectors)
+        self.index = ExactIndex(root, quantization=quantization) if quantization != "none" else self.reference
+        self.store = ExactVectorStore(self.index, embeddings)
+
+    def search(self, vector: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return [self.index.document(i) for i, _ in self.index.search(vector, k, where)]
+
+    def agreement(self, vector: List[float], k: int) -> float:
+        """Share of the float32 top-k that the searched (possibly quantized) index also returns."""
+        exact = {i for i, _ in self.reference.search(vector, k)}
+        return len(exact & {i for i, _ in self.index.search(vector, k)}) / max(len(exact), 1)
+
+    def memory(self) -> Dict[str, Any]:
+        resident, full = self.index.resident_bytes(), self.reference.resident_bytes()
+        return {"resident_vector_bytes": resident, "float32_vector_bytes": full, "saved_ratio": round(1 - resident / full, 4) if full else None}
+
+
+class _ChromaBackend:
+    def __init__(self, chunks: List[Document], embeddings: Embeddings, root: Path, quantization: str = "none") -> None:
+        from langchain_community.vectorstores import Chroma
+        self.db = Chroma(
+            persist_directory=str(root),
+            embedding_function=embeddings,
+            collection_name=COLLECTION,
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        self.db.add_documents(chunks, ids=[f"c{i}" for i in range(len(chunks))])
+        self.store = self.db
+
+    def search(self, vector: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.db.similarity_search_by_vector(vector, k=k, filter=where)
+
+
+def run_benchmark(
+    queries: List[Dict[str, Any]],
+    chunks: List[Document],
+    backend: str = "exact",
+    quantization: str = "none",
+    route: bool = False,
+    rerank: bool = True,
+    mode: str = "fixed",
+    candidates: int = 20,
+    repeat: int = 3,
+) -> Dict[str, Any]:
+    """
+    Runs queries through the production retriever (_make_retriever) over an index of chunks.
+    "dense" is unrouted vector search (candidates deep); "final" is what the retriever returns.
+    rerank=False keeps only the retriever's dense stage (routing included; fixed mode only).
+    """
+    if not rerank and mode != "fixed":
+        raise ValueError("rerank=False is only available in fixed mode")
+    embeddings = HashingEmbeddings()
+    top_n = 5
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        backend_store = (_ChromaBackend if backend == "chroma" else _ExactBackend)(chunks, embeddings, Path(tmp) / "index", quantization)
+        build_seconds = time.perf_counter() - t0
+        memory = backend_store.memory() if isinstance(backend_store, _ExactBackend) else None
+
+        router = _section_router([c.metadata for c in chunks]) if route else None
+        retriever = _make_retriever(backend_store.store, {"k": candidates}, mode, router=router)
+        if not rerank:
+            # the compression retriever's candidate stage: routed or plain dense search
+            retriever = retriever.base_retriever
+
+        latency: Dict[str, List[float]] = {"dense_search": [], "retrieve": []}
+        dense_ranked: List[List[bool]] = []
+        final_ranked: List[List[bool]] = []
+        per_query = []
+        agreement: List[float] = []
+        for q in queries:
+            for rep in range(repeat):
+                t0 = time.perf_counter()
+                hits = backend_store.store.similarity_search(q["query"], k=candidates)
+                t1 = time.perf_counter()
+                final = retriever.invoke(q["query"])[:top_n]
+                t2 = time.perf_counter()
+                latency["dense_search"].append((t1 - t0) * 1000)
+                latency["retrieve"].append((t2 - t1) * 1000)
+            if isinstance(backend_store, _ExactBackend):
+                agreement.append(backend_store.agreement(embeddings.embed_query(q["query"]), candidates))
+            dense = [is_relevant(d, q) for d in hits]
+            reranked = [is_relevant(d, q) for d in final]
+            dense_ranked.append(dense)
+            final_ranked.append(reranked)
+            per_query.append({
+                "id": q["id"],
+                "candidates": len(hits),
+                "dense_rank": dense.index(True) + 1 if any(dense) else None,
+                "final_rank": reranked.index(True) + 1 if any(reranked) else None,
+            })
+
+    return {
+        "config": {
+            "backend": backend,
+            "quantization": quantization if backend == "exact" else None,
+            "route": router is not None,
+            "rerank": rerank,
+            "mode": mode,
+            "candidates": candidates,
+            "top_n": top_n,
+            "repeat": repeat,
+            "chunks": len(chunks),
+            "queries": len(queries),
+            "embedder": f"HashingEmbeddings(dim={embeddings.dim})",
+        },
+        "build_seconds": round(build_seconds, 3),
+        "dense": quality(dense_ranked),
+        "final": quality(final_ranked, ks=[k for k in KS if k <= top_n]),
+        "latency_ms": {stage: percentiles(v) for stage, v in latency.items() if v},
+        "memory": memory,
+        f"topk_agreement_vs_float32@{candidates}": round(float(np.mean(agreement)), 4) if agreement else None,
+        "adaptive": adaptive_stats() if mode == "adaptive" else None,
+        "per_query": per_query,
+    }
+
+
+def check_regression(
+    result: Dict[str, Any],
+    baseline: Dict[str, Any],
+    max_recall_drop: float = 0.02,
+    max_latency_increase: Optional[float] = None,
+) -> List[str]:
+    """Human-readable regressions of result vs baseline (empty list = pass)."""
+    problems = []
+    for section in ("dense", "final"):
+        for metric, old in baseline.get(section, {}).items():
+            new = result.get(section, {}).get(metric)
+            if new is not None and old is not None and new < old - max_recall_drop:
+                problems.append(f"{section} {metric}: {old} -> {new}")
+    if max_latency_increase is not None:
+        for stage, old in baseline.get("latency_ms", {}).items():
+            new = result.get("latency_ms", {}).get(stage)
+            if new and old.get("p95") and new["p95"] > old["p95"] * (1 + max_latency_increase):
+                problems.append(f"{stage} p95: {old['p95']} ms -> {new['p95']} ms")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency over Data/pdfs.")
+    parser.add_argument("--pdf-dir", default=str(PDF_DIR))
+    parser.add_argument("--queries", default=str(QUERIES_PATH))
+    parser.add_argument("--backend", choices=("exact", "chroma"), default="exact")
+    parser.add_argument("--quantization", choices=("none", "int8"), default="none", help="exact backend vector storage")
+    parser.add_argument("--route", action="store_true", help="restrict dense search with the section router")
+    parser.add_argument("--mode", choices=("fixed", "adaptive"), default="fixed", help="retrieval mode (see vectorize)")
+    parser.add_argument("--no-rerank", action="store_true", help="skip the cross-encoder stage (fixed mode)")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions per query")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-increase", type=float, default=None, help="e.g. 0.5 = +50%% p95")
+    args = parser.parse_args()
+    if args.no_rerank and args.mode != "fixed":
+        parser.error("--no-rerank needs --mode fixed")
+
+    queries = json.loads(Path(args.queries).read_text(encoding="utf-8"))
+    with tempfile.TemporaryDirectory() as work:
+        chunks = build_chunks(Path(args.pdf_dir), Path(work))
+    result = run_benchmark(
+        queries, chunks, backend=args.backend, quantization=args.quantization, route=args.route, rerank=not args.no_rerank,
+        mode=args.mode, candidates=args.candidates, repeat=args.repeat,
+    )
+
+    print(f"--- {result['config']['chunks']} chunks, {len(queries)} queries, backend={args.backend}, mode={args.mode} ---")
+    print(f"dense: {result['dense']}")
+    print(f"final: {result['final']}")
+    if result["memory"]:
+        m = result["memory"]
+        print(f"vectors resident {m['resident_vector_bytes']} B vs float32 {m['float32_vector_bytes']} B "
+              f"(saved {m['saved_ratio']:.0%}), top-{args.candidates} agreement "
+              f"{result[f'topk_agreement_vs_float32@{args.candidates}']}")
+    for stage, p in result["latency_ms"].items():
+        print(f"{stage:<13} p50 {p['p50']:8.3f} ms   p95 {p['p95']:8.3f} ms")
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        problems = check_regression(result, baseline, args.max_recall_drop, args.max_latency_increase)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print("--- no regression vs baseline ---")
+
+
+if __name__ == "__main__":
+    main()
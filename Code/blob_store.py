@@ -0,0 +1,133 @@
+# Code/blob_store.py
+# Content-addressed store for uploaded files. Each distinct upload is stored once under
+# uploads/_blobs/<sha256>; session folders only hold hard links (or copies where links
+# aren't possible) to those blobs. refs.json tracks which sessions reference each blob, so
+# a blob is deleted when its last session is released.
+# Session-side files are links: treat them as read-only.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+BLOB_DIR = Path(__file__).resolve().parent.parent / "uploads" / "_blobs"
+
+
+class BlobStore:
+    """Stores bytes once by SHA-256 and reference-counts them per session."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.refs_path = self.root / "refs.json"
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._refs: Dict[str, List[str]] = self._load_refs()
+
+    def _load_refs(self) -> Dict[str, List[str]]:
+        try:
+            return json.loads(self.refs_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_refs(self) -> None:
+        tmp = self.refs_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._refs), encoding="utf-8")
+        os.replace(tmp, self.refs_path)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest
+
+    def put(self, data: bytes, session_id: str) -> str:
+        """Stores data (once) and records a reference from session_id; returns its SHA-256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        # write + reference under one lock so a concurrent release can't delete it in between
+        with self._lock:
+            try:
+                # fresh mtime: gc's grace period covers re-used blobs too
+                os.utime(path)
+            except FileNotFoundError:
+                tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            holders = self._refs.setdefault(digest, [])
+            if session_id not in holders:
+                holders.append(session_id)
+                self._save_refs()
+        return digest
+
+    def link(self, digest: str, dest: str) -> str:
+        """Places a referenced blob at dest (hard link, falling back to a copy)."""
+        dest_path = Path(dest)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if dest_path.exists():
+            dest_path.unlink()
+        try:
+            os.link(self.blob_path(digest), dest_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), dest_path)
+        return str(dest_path)
+
+    def release(self, session_id: str) -> List[str]:
+        """Drops a session's references and deletes blobs nobody references any more."""
+        freed: List[str] = []
+        with self._lock:
+            for digest in list(self._refs):
+                holders = self._refs[digest]
+                if session_id in holders:
+                    holders.remove(session_id)
+                if not holders:
+                    del self._refs[digest]
+                    freed.append(digest)
+            self._save_refs()
+            for digest in freed:
+                self.blob_path(digest).unlink(missing_ok=True)
+        return freed
+
+    def gc(
+        self,
+        live_sessions: Optional[Iterable[str]] = None,
+        dry_run: bool = False,
+        min_age_seconds: float = 0.0,
+    ) -> Dict[str, List[str]]:
+        """
+        Removes blobs with no references. With live_sessions, references held by any
+        other session (e.g. left over from a previous server process) are dropped first.
+        Without it (CLI, another process may own the store) refs.json is re-read and never rewritten.
+        Blobs stored or re-used within min_age_seconds are kept (an upload may not be
+        registered with its session yet).
+        """
+        now = time.time()
+        with self._lock:
+            if live_sessions is None:
+                self._refs = self._load_refs()
+            refs = {d: list(h) for d, h in self._refs.items()}
+            if live_sessions is not None:
+                live = set(live_sessions)
+                refs = {d: [s for s in h if s in live] for d, h in refs.items()}
+            referenced = {d for d, h in refs.items() if h}
+            orphans = [
+                p.name for p in self.root.iterdir()
+                if p.is_file() and p.name != self.refs_path.name and "." not in p.name
+                and p.name not in referenced and now - p.stat().st_mtime >= min_age_seconds
+            ]
+            if not dry_run:
+                if live_sessions is not None:
+                    self._refs = {d: h for d, h in refs.items() if h}
+                    self._save_refs()
+                for digest in orphans:
+                    self.blob_path(digest).unlink(missing_ok=True)
+        return {"removed": orphans}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n_refs = sum(len(h) for h in self._refs.values())
+            n_blobs = len(self._refs)
+        size = sum(p.stat().st_size for p in self.root.iterdir() if p.is_file() and "." not in p.name)
+        return {"blobs": n_blobs, "references": n_refs, "bytes": size}
+
+
+BLOB_STORE = BlobStore(BLOB_DIR)
@@ -0,0 +1,145 @@
+# Code/bulk_ingest.py
+# Bulk (library-scale) ingestion: PDFs flow through preflight -> Docling -> chunking -> embedding
+# a small batch at a time, so memory stays bounded whatever the library size.
+# Progress is checkpointed to a manifest, so an interrupted run resumes where it stopped.
+# Run: python -m Code.bulk_ingest <pdf_dir> [--work-dir DIR] [--batch-size 8]
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .hashing import file_sha256
+from .ingestion import ingest_files, ingest_pdfs, preflight_pdfs
+from .pdf_to_markdown import STREAM_WINDOW_PAGES
+from .vectorize import CHROMA_DIR, build_retriever, index_documents
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "bulk_manifest.json"
+LIBRARY_INDEX_DIR = CHROMA_DIR / "library"
+
+
+def _load_manifest(path: Path) -> Dict:
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {"done": {}, "failed": {}}
+
+
+def _save_manifest(path: Path, manifest: Dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def bulk_ingest(
+    pdf_paths: List[str],
+    work_dir: str,
+    persist_dir: Optional[Path] = None,
+    batch_size: int = 8,
+    workers: int = 1,
+    stream_window_pages: Optional[int] = STREAM_WINDOW_PAGES,
+    progress: Optional[Callable[[Dict], None]] = None,
+):
+    """
+    Builds one vector index over an arbitrarily large PDF library with bounded in-flight work.
+
+    Only batch_size PDFs (their Markdown, chunks and embeddings) are in memory at a time.
+    Finished files are recorded by PDF content hash in <work_dir>/bulk_manifest.json after
+    each batch; re-running with the same work_dir skips them. Indexing goes through
+    vectorize.index_documents, so chunks get the same <doc_hash>:<n> ids (Markdown content
+    hash) and index manifest as build_retriever: a batch that was embedded but not yet
+    checkpointed is not embedded again, and the library is registered as one dataset whose
+    superseded documents (e.g. re-converted Markdown) are deleted.
+
+    Args:
+        pdf_paths: PDFs to index (any number).
+        work_dir: Holds converted Markdown and the resume manifest.
+        persist_dir: Chroma directory for the library index (default CHROMA_DIR/library).
+        progress: Optional callback receiving {"done", "failed", "total", "batch_seconds"} per batch.
+
+    Returns:
+        The reranking retriever over the whole library (None when nothing was indexed);
+        release it with vectorize.release_retriever().
+    """
+    work_dir = Path(work_dir)
+    md_dir = work_dir / "md"
+    md_dir.mkdir(parents=True, exist_ok=True)
+    persist_dir = Path(persist_dir or LIBRARY_INDEX_DIR)
+    manifest_path = work_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_path)
+
+    total = len(pdf_paths)
+    for start in range(0, total, batch_size):
+        t0 = time.time()
+        batch = pdf_paths[start:start + batch_size]
+
+        # 1. cheap sampled validation (also gives the content hash used for resume)
+        todo: Dict[str, str] = {}
+        for report in preflight_pdfs(batch):
+            sha = report["sha256"]
+            if sha and sha in manifest["done"]:
+                continue
+            if not report["valid"]:
+                manifest["failed"][sha or report["file"]] = {"file": report["file"], "error": report["error"]}
+                continue
+            todo[report["file"]] = sha
+
+        if todo:
+            # 2. one Docling pass per PDF
+            _, errors, _, _, reports = ingest_pdfs(
+                list(todo), str(md_dir), workers=workers, stream_window_pages=stream_window_pages,
+            )
+            for err in errors:
+                manifest["failed"][todo[err["file"]]] = err
+
+            # 3. chunk + 4. embed: only the batch's new documents are read and embedded
+            converted = {
+                todo[rec["file"]]: {"file": rec["file"], "md_path": str(rec["md_path"]), "doc_hash": file_sha256(rec["md_path"])}
+                for rec in reports if rec["valid"]
+            }
+            library = [d["md_path"] for d in manifest["done"].values() if Path(d["md_path"]).exists()]
+            n_chunks = index_documents(library + [d["md_path"] for d in converted.values()], persist_dir, prune_missing=True)
+            for sha, entry in converted.items():
+                manifest["done"][sha] = {**entry, "chunks": n_chunks[entry["doc_hash"]]}
+                manifest["failed"].pop(sha, None)
+
+        _save_manifest(manifest_path, manifest)
+
+        status = {
+            "done": len(manifest["done"]),
+            "failed": len(manifest["failed"]),
+            "total": total,
+            "batch_seconds": round(time.time() - t0, 2),
+        }
+        logger.info("Bulk ingest progress: %s", status)
+        if progress:
+            progress(status)
+
+    library = [d["md_path"] for d in manifest["done"].values() if Path(d["md_path"]).exists()]
+    return build_retriever(library, persist_dir, prune_missing=True) if library else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a large PDF library in bounded-memory batches.")
+    parser.add_argument("pdf_dir")
+    parser.add_argument("--work-dir", default=str(Path(__file__).resolve().parent.parent / "Data" / "bulk"))
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.pdf_dir).glob("*.pdf"))
+    _, pdf_paths = ingest_files(paths, validate_pdfs=False, bulk=True)
+    bulk_ingest(
+        pdf_paths,
+        args.work_dir,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        progress=lambda s: print(f"[bulk] {s['done']}/{s['total']} done, {s['failed']} failed ({s['batch_seconds']}s)"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Code/chunk_dedup.py
+# Chunk-level redundancy removal:
+#   dedup_chunks       - drops exact and near-duplicate chunks (word-shingle MinHash + LSH)
+#                        before embedding; kept chunks record what they stand for
+#   merge_overlapping  - stitches retrieved neighbours that share splitter overlap so the
+#                        overlapping text appears once in the evidence
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.6 Jaccard almost always become candidates
+NEAR_DUP_THRESHOLD = 0.85
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1234)
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+_WORD = re.compile(r"\w+")
+# tokens that carry a quantity: chunks differing in one of these are never near-duplicates
+_NUMBER_WORDS = frozenset(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty thirty forty fifty sixty seventy eighty ninety "
+    "hundred thousand million billion half quarter first second third".split()
+)
+
+
+def _shingles(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.int64,
+        count=len(grams),
+    )
+
+
+def minhash(text: str) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of the text's word shingles."""
+    x = _shingles(text)
+    return ((np.outer(_PERM_A, x) + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _differs_in_numbers(a: str, b: str) -> bool:
+    """True when the words only one of a / b contains include a digit or a number word."""
+    diff = set(_WORD.findall(a)) ^ set(_WORD.findall(b))
+    return any(w in _NUMBER_WORDS or any(ch.isdigit() for ch in w) for w in diff)
+
+
+def _chunk_ref(chunk: Document) -> str:
+    return f"{chunk.metadata.get('doc_id', '')}@{chunk.metadata.get('start_index', '')}"
+
+
+def dedup_chunks(chunks: List[Document], threshold: float = NEAR_DUP_THRESHOLD) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    Keeps the first of each group of exact / near-duplicate chunks (estimated Jaccard >= threshold).
+
+    Only compare chunks of the same document (doc_hash): the index is shared between datasets,
+    so a document must never depend on another document's chunks. Near-duplicates must also
+    share a section_id and must not differ in any number (digits or number words): sections
+    like "Standard items" / "Electronics" often repeat boilerplate around the one fact that
+    differs. Across sections only exact duplicates are dropped.
+    Kept chunks get dup_count (chunks they represent, incl. themselves) and, when they absorbed
+    others, merged_from ("doc_id@start_index;..." of the dropped chunks; Chroma metadata is scalar).
+    """
+    rows = NUM_PERM // BANDS
+    kept: List[Document] = []
+    report = {"input": len(chunks), "exact_dups": 0, "near_dups": 0}
+    exact: Dict[Tuple[str, str], Document] = {}
+    buckets: Dict[Tuple[Tuple[str, str], int, bytes], List[int]] = {}
+    sigs: List[np.ndarray] = []
+    norms: List[str] = []
+
+    for chunk in chunks:
+        doc = chunk.metadata.get("doc_hash") or chunk.metadata.get("source", "")
+        norm = " ".join(chunk.page_content.lower().split())
+        digest = hashlib.sha256(norm.encode("utf-8")).hexdigest()
+
+        keeper: Optional[Document] = exact.get((doc, digest))
+        if keeper is not None:
+            report["exact_dups"] += 1
+        else:
+            sig = minhash(norm)
+            section = (doc, chunk.metadata.get("section_id", ""))
+            keys = [(section, b, sig[b * rows:(b + 1) * rows].tobytes()) for b in range(BANDS)]
+            candidates = {
+                i for key in keys for i in buckets.get(key, ()) if not _differs_in_numbers(norms[i], norm)
+            }
+            best = max(candidates, key=lambda i: float(np.mean(sigs[i] == sig)), default=None)
+            if best is not None and float(np.mean(sigs[best] == sig)) >= threshold:
+                keeper = kept[best]
+                report["near_dups"] += 1
+            else:
+                exact[(doc, digest)] = chunk
+                for key in keys:
+                    buckets.setdefault(key, []).append(len(kept))
+                sigs.append(sig)
+                norms.append(norm)
+                chunk.metadata["dup_count"] = 1
+                kept.append(chunk)
+                continue
+
+        keeper.metadata["dup_count"] += 1
+        refs = keeper.metadata.get("merged_from")
+        keeper.metadata["merged_from"] = f"{refs};{_chunk_ref(chunk)}" if refs else _chunk_ref(chunk)
+
+    report["kept"] = len(kept)
+    return kept, report
+
+
+def _overlap(a: str, b: str, min_overlap: int = 20, max_overlap: int = 400) -> int:
+    """Length of the longest suffix of a that is also a prefix of b (0 if < min_overlap)."""
+    for n in range(min(len(a), len(b), max_overlap), min_overlap - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def merge_overlapping(chunks: List[Document]) -> List[str]:
+    """
+    Evidence passages from retrieved chunks, in retrieval order, with neighbouring chunks of
+    the same section (sharing splitter overlap) stitched into one passage.
+    """
+    passages: List[str] = []
+    # section key -> passage index and the chunk ordering inside it
+    sections: Dict[Tuple, int] = {}
+    for c in chunks:
+        key = (c.metadata.get("source"),) + tuple(c.metadata.get(h) for h in ("h1", "h2", "h3", "h4"))
+        text = c.page_content
+        idx = sections.get(key)
+        if idx is not None:
+            prev = passages[idx]
+            if text in prev:
+                continue
+            n = _overlap(prev, text)
+            if n:
+                passages[idx] = prev + text[n:]
+                continue
+            n = _overlap(text, prev)
+            if n:
+                passages[idx] = text + prev[n:]
+                continue
+        sections.setdefault(key, len(passages))
+        passages.append(text)
+    return passages
@@ -0,0 +1,207 @@
+# Code/embedding_cache.py
+# Persistent embedding cache keyed by (model name, normalized chunk text).
+# On disk (all memory-mapped, so a write touches only the slots it changes):
+#   vectors.f32  float32 matrix (capacity x dim)
+#   keys.npy     sha256 key per slot (capacity x 32 uint8)
+#   ticks.npy    last-use counter per slot (0 = free), drives LRU eviction once full
+#   state.npy    [tick, generation]; generation changes whenever any process stores entries
+#   meta.json    {"dim", "capacity"}
+#   .lock        exclusive flock held while storing (several processes can share a cache dir)
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: thread-safe within one process only
+    fcntl = None
+
+EMBED_CACHE_DIR = Path(__file__).resolve().parent.parent / "Data" / "embedding_cache"
+# 50k x 1024-d float32 ~= 200 MB
+DEFAULT_CAPACITY = 50_000
+_EMPTY_KEY = bytes(32)
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Whitespace-insensitive form used for the cache key."""
+    return " ".join(text.split())
+
+
+def embedding_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\x00{normalize_chunk_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Fixed-capacity, memory-mapped vector cache with LRU eviction.
+    Thread-safe, and safe to share between processes: stores run under a file lock after
+    re-reading the slot table, and lookups verify the slot still holds the key.
+    """
+
+    def __init__(self, root: Path = EMBED_CACHE_DIR, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.root = Path(root)
+        self.capacity = capacity
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._ticks: Optional[np.memmap] = None
+        self._state: Optional[np.memmap] = None
+        self._generation = -1
+        self._slots: Dict[bytes, int] = {}
+        self._open_existing()
+
+    # --- storage ------------------------------------------------------------
+    @contextmanager
+    def _file_lock(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a+b") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _open_existing(self) -> None:
+        meta_path = self.root / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.dim, self.capacity = meta["dim"], meta["capacity"]
+        self._vectors = np.memmap(self.root / "vectors.f32", dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self._keys = np.load(self.root / "keys.npy", mmap_mode="r+")
+        self._ticks = np.load(self.root / "ticks.npy", mmap_mode="r+")
+        state_path = self.root / "state.npy"
+        if not state_path.exists():
+            # caches written before state.npy kept the tick in meta.json
+            state = np.lib.format.open_memmap(state_path, mode="w+", dtype=np.int64, shape=(2,))
+            state[:] = (meta.get("tick", int(self._ticks.max(initial=0))), 0)
+            state.flush()
+        self._state = np.load(state_path, mmap_mode="r+")
+        self._sync()
+
+    def _create(self, dim: int) -> None:
+        """Creates the files (caller holds the file lock); meta.json goes last, marking them complete."""
+        self.dim = dim
+        np.memmap(self.root / "vectors.f32", dtype=np.float32, mode="w+", shape=(self.capacity, dim)).flush()
+        np.lib.format.open_memmap(self.root / "keys.npy", mode="w+", dtype=np.uint8, shape=(self.capacity, 32)).flush()
+        np.lib.format.open_memmap(self.root / "ticks.npy", mode="w+", dtype=np.int64, shape=(self.capacity,)).flush()
+        np.lib.format.open_memmap(self.root / "state.npy", mode="w+", dtype=np.int64, shape=(2,)).flush()
+        meta = {"dim": dim, "capacity": self.capacity}
+        (self.root / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    def _sync(self) -> None:
+        """Re-reads the slot table if another process stored entries since the last look."""
+        generation = int(self._state[1])
+        if generation == self._generation:
+            return
+        self._slots = {self._keys[i].tobytes(): int(i) for i in np.flatnonzero(self._ticks)}
+        self._generation = generation
+
+    # --- API ----------------------------------------------------------------
+    def get_many(self, keys: List[bytes]) -> List[Optional[List[float]]]:
+        """Cached vectors (or None) for each key; hits count as a use for LRU."""
+        out: List[Optional[List[float]]] = []
+        with self._lock:
+            if self._vectors is None:
+                self._open_existing()
+            if self._vectors is not None:
+                self._sync()
+            for key in keys:
+                slot = self._slots.get(key)
+                vec = None
+                # another process may have evicted the slot since the table was read
+                if slot is not None and self._keys[slot].tobytes() == key:
+                    vec = self._vectors[slot].tolist()
+                    if self._keys[slot].tobytes() != key:
+                        vec = None
+                if vec is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self.hits += 1
+                self._state[0] += 1
+                self._ticks[slot] = self._state[0]
+                out.append(vec)
+        return out
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]) -> None:
+        """Stores vectors, evicting least-recently-used entries when full."""
+        if not keys:
+            return
+        with self._lock, self._file_lock():
+            if self._vectors is None:
+                self._open_existing()
+            if self._vectors is None:
+                self._create(len(vectors[0]))
+                self._open_existing()
+            self._sync()
+            new = [(k, v) for k, v in dict(zip(keys, vectors)).items() if k not in self._slots]
+            if not new:
+                return
+            new = new[-self.capacity:]
+            # free slots have tick 0, so the lowest ticks are free slots first, then LRU entries
+            slots = np.argpartition(self._ticks, len(new) - 1)[:len(new)] if len(new) < self.capacity else np.arange(self.capacity)
+            for slot, (key, vec) in zip(slots, new):
+                if self._ticks[slot]:
+                    self._slots.pop(self._keys[slot].tobytes(), None)
+                # clear the key while the vector is rewritten: concurrent readers see a miss
+                self._keys[slot] = np.frombuffer(_EMPTY_KEY, dtype=np.uint8)
+                self._vectors[slot] = np.asarray(vec, dtype=np.float32)
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._state[0] += 1
+                self._ticks[slot] = self._state[0]
+                self._slots[key] = int(slot)
+            self._state[1] += 1
+            self._generation = int(self._state[1])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._slots), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model; document embeddings are served from EmbeddingCache when possible."""
+
+    def __init__(self, inner: Embeddings, model_name: str, cache: EmbeddingCache, query_cache: Optional[Any] = None) -> None:
+        self.inner = inner
+        self.model_name = model_name
+        self.cache = cache
+        # optional in-memory get/put cache for query embeddings (see query_cache.TTLCache)
+        self.query_cache = query_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # one call for all misses (duplicates inside the batch are embedded once)
+            unique: Dict[bytes, int] = {}
+            for i in missing:
+                unique.setdefault(keys[i], i)
+            fresh = self.inner.embed_documents([texts[i] for i in unique.values()])
+            by_key = dict(zip(unique, fresh))
+            self.cache.put_many(list(by_key), list(by_key.values()))
+            for i in missing:
+                vectors[i] = by_key[keys[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.inner.embed_query(text)
+        key = (self.model_name, normalize_chunk_text(text))
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
@@ -0,0 +1,109 @@
+# Code/embedding_executor.py
+# Batched, concurrent embedding for index builds: chunks are embedded batch_size at a time
+# on a small thread pool (bounded concurrency against Ollama), failed batches are retried
+# with exponential backoff, and each finished batch is upserted straight into the Chroma
+# collection together with its precomputed vectors.
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingExecutor:
+    """Embeds texts in parallel batches with retries and reports throughput."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 32,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+    ) -> None:
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.last_stats: Dict[str, Any] = {}
+        self._retries = 0
+        self._retry_lock = threading.Lock()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                with self._retry_lock:
+                    self._retries += 1
+                logger.warning("Embedding batch failed (%s); retry %d in %.1fs", e, attempt + 1, delay)
+                time.sleep(delay)
+
+    def _run(self, texts: List[str], on_batch) -> None:
+        self._retries = 0
+        t0 = time.perf_counter()
+        batches = [(start, texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as pool:
+            futures = {pool.submit(self._embed_batch, batch): start for start, batch in batches}
+            for fut in as_completed(futures):
+                on_batch(futures[fut], fut.result())
+
+        seconds = time.perf_counter() - t0
+        self.last_stats = {
+            "chunks": len(texts),
+            "batches": len(batches),
+            "retries": self._retries,
+            "seconds": round(seconds, 3),
+            "chunks_per_s": round(len(texts) / seconds, 1) if seconds > 0 else None,
+        }
+        logger.info("Embedded %s", self.last_stats)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts and returns vectors in input order."""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        def collect(start: int, batch_vectors: List[List[float]]) -> None:
+            vectors[start:start + len(batch_vectors)] = batch_vectors
+
+        self._run(texts, collect)
+        return vectors
+
+    def index(self, collection, chunks: List[Document], ids: List[str]) -> Dict[str, Any]:
+        """
+        Embeds chunks and upserts each finished batch into a chromadb collection
+        (ids, vectors, texts, metadata); returns the throughput stats.
+        """
+        texts = [c.page_content for c in chunks]
+
+        def upsert(start: int, batch_vectors: List[List[float]]) -> None:
+            end = start + len(batch_vectors)
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=batch_vectors,
+                documents=texts[start:end],
+                metadatas=[c.metadata for c in chunks[start:end]],
+            )
+
+        self._run(texts, upsert)
+        return self.last_stats
+
+    @staticmethod
+    def upsert(collection, chunks: List[Document], ids: List[str], vectors: List[List[float]], batch_size: int = 512) -> None:
+        """Upserts chunks with vectors embedded beforehand (e.g. outside an index lock)."""
+        for start in range(0, len(chunks), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=[c.page_content for c in chunks[start:end]],
+                metadatas=[c.metadata for c in chunks[start:end]],
+            )
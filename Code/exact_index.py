@@ -0,0 +1,246 @@
+# Code/exact_index.py
+# In-process exact (brute-force cosine) vector index for small corpora.
+# A few hundred policy chunks don't need Chroma/HNSW: one matrix multiply over a
+# memory-mapped float32 matrix is exact and sub-millisecond. On disk (one dir per index):
+#   vectors.f32  L2-normalised float32 matrix (count x dim), loaded with np.memmap (no parsing)
+#   codes.i8     int8 codes of the same matrix (count x dim), one scale per row in scales.f32
+#   meta.json    {"dim", "count", "model"}
+#   docs.json    {"ids", "texts", "metadatas"} row-aligned with vectors.f32
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+def match_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Chroma-style metadata filter: {field: value}, {field: {"$eq"|"$ne"|"$in"|"$nin": ...}}, {"$and"|"$or": [...]}."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(match_filter(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(match_filter(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, arg in cond.items():
+                if op == "$eq" and value != arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 codes: row ~= codes * scale."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _write_codes(root: Path, matrix: np.ndarray) -> None:
+    """
+    Writes codes.i8 / scales.f32 via temp file + rename (scales first: codes.i8 existing
+    means both are complete), so a concurrent reader never maps a half-written file.
+    """
+    codes, scales = quantize_int8(matrix)
+    suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+    for name, arr in (("scales.f32", scales), ("codes.i8", codes)):
+        tmp = root / f"{name}.{suffix}"
+        arr.tofile(tmp)
+        os.replace(tmp, root / name)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class ExactIndex:
+    """
+    Read-only exact index at root (see build()).
+
+    quantization="int8" keeps only the int8 codes in memory (4x smaller): search scores all
+    rows on the codes, then rescores a shortlist of rescore_factor * k rows with the exact
+    float32 vectors, read lazily from the memory-mapped vectors.f32.
+    """
+
+    # int8 search scores the codes in blocks, so the float32 upcast stays small
+    _BLOCK_ROWS = 2048
+
+    def __init__(self, root: Path, quantization: str = "none", rescore_factor: int = 4) -> None:
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))
+        self.dim, self.count, self.model = meta["dim"], meta["count"], meta.get("model")
+        self.vectors = np.memmap(self.root / "vectors.f32", dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        if quantization == "int8" and self.count:
+            if not (self.root / "codes.i8").exists():
+                # index built before quantized storage existed
+                _write_codes(self.root, np.asarray(self.vectors))
+            self.codes = np.fromfile(self.root / "codes.i8", dtype=np.int8).reshape(self.count, self.dim)
+            self.scales = np.fromfile(self.root / "scales.f32", dtype=np.float32)
+        docs = json.loads((self.root / "docs.json").read_text(encoding="utf-8"))
+        self.ids: List[str] = docs["ids"]
+        self.texts: List[str] = docs["texts"]
+        self.metadatas: List[Dict[str, Any]] = docs["metadatas"]
+        self._masks: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def exists(root: Path) -> bool:
+        return (Path(root) / "meta.json").exists()
+
+    @staticmethod
+    def build(
+        root: Path,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        vectors: Iterable[List[float]],
+        model: Optional[str] = None,
+    ) -> "ExactIndex":
+        """Writes an index into a temp dir and renames it into place (readers never see a partial index)."""
+        root = Path(root)
+        matrix = _normalize_rows(np.asarray(list(vectors), dtype=np.float32).reshape(len(ids), -1))
+        tmp = root.parent / f".{root.name}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp.mkdir(parents=True)
+        try:
+            mm = np.memmap(tmp / "vectors.f32", dtype=np.float32, mode="w+", shape=matrix.shape)
+            mm[:] = matrix
+            mm.flush()
+            del mm
+            _write_codes(tmp, matrix)
+            docs = {"ids": ids, "texts": texts, "metadatas": metadatas}
+            (tmp / "docs.json").write_text(json.dumps(docs), encoding="utf-8")
+            meta = {"dim": int(matrix.shape[1]), "count": len(ids), "model": model}
+            (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            if root.exists():
+                shutil.rmtree(root)
+            os.replace(tmp, root)
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+        return ExactIndex(root)
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((match_filter(m, where) for m in self.metadatas), dtype=bool, count=self.count)
+            if len(self._masks) >= 256:
+                # routed filters vary per query: keep the cache bounded
+                self._masks.clear()
+            self._masks[key] = mask
+        return mask
+
+    def search(self, query_vector: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine similarity), best first."""
+        if self.count == 0:
+            return []
+        q = np.asarray(query_vector, dtype=np.float32)
+        q /= (np.linalg.norm(q) or 1.0)
+        sims = self._approx_sims(q) if self.codes is not None else self.vectors @ q
+        mask = self._mask(where)
+        if mask is not None:
+            sims = np.where(mask, sims, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, self.count)
+        if k <= 0:
+            return []
+        if self.codes is None:
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            return [(int(i), float(sims[i])) for i in top]
+
+        # shortlist on the codes, exact float32 rescoring of just those rows
+        n = min(self.count if mask is None else int(mask.sum()), max(k * self.rescore_factor, k))
+        shortlist = np.sort(np.argpartition(-sims, n - 1)[:n])
+        exact = np.asarray(self.vectors[shortlist]) @ q
+        order = np.argsort(-exact)[:k]
+        return [(int(shortlist[i]), float(exact[i])) for i in order]
+
+    def _approx_sims(self, q: np.ndarray) -> np.ndarray:
+        sims = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, self._BLOCK_ROWS):
+            block = self.codes[start:start + self._BLOCK_ROWS]
+            sims[start:start + len(block)] = block.astype(np.float32) @ q
+        return sims * self.scales
+
+    def resident_bytes(self) -> int:
+        """Vector bytes search keeps hot: the codes (int8) or the whole float32 matrix."""
+        if self.codes is not None:
+            return int(self.codes.nbytes + self.scales.nbytes)
+        return int(self.count * self.dim * 4)
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=dict(self.metadatas[row]), id=self.ids[row])
+
+
+class ExactVectorStore(VectorStore):
+    """LangChain VectorStore over an ExactIndex, so it plugs into the same retrievers as Chroma."""
+
+    def __init__(self, index: ExactIndex, embedding: Embeddings) -> None:
+        self.index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits = self.index.search(self._embedding.embed_query(query), k, filter)
+        return [(self.index.document(i), s) for i, s in hits]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # cosine distance, like Chroma with hnsw:space=cosine
+        return [(d, 1.0 - s) for d, s in self.similarity_search_with_relevance_scores(query, k, filter)]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_relevance_scores(query, k, filter)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: Optional[Path] = None,
+        **kwargs: Any,
+    ) -> "ExactVectorStore":
+        if path is None:
+            raise ValueError("ExactVectorStore.from_texts needs path=<index dir>")
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        index = ExactIndex.build(path, list(ids), list(texts), list(metadatas), embedding.embed_documents(list(texts)))
+        return cls(index, embedding)
@@ -0,0 +1,321 @@
+# Code/gc_index.py
+# Garbage collection + compaction for on-disk state that otherwise only grows:
+#   - legacy per-dataset index folders under CHROMA_DIR (<16-hex dataset hash>/)
+#   - upload folders (uploads/<session_id>/) of sessions that no longer exist
+#   - upload blobs nobody references
+#   - exact indexes (CHROMA_DIR/exact/<key>/) that are stale or least recently used
+#   - documents in the shared index (INDEX_DIR) beyond the size budget, least recently used first
+#   - index versions left behind by interrupted blue/green rebuilds (<slot>/versions/<name>/)
+# Anything used by a live session or accessed within min_idle_seconds is never removed.
+# Indexes are only ever changed by the serving process (start_gc_thread in api.py): it owns
+# the open Chroma stores and the in-memory access times. The CLI reports on them but only
+# deletes orphaned upload folders and blobs.
+# Run: python -m Code.gc_index            (dry run: report only)
+#      python -m Code.gc_index --apply    (uploads and blobs only)
+import argparse
+import json
+import logging
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .blob_store import BLOB_DIR, BLOB_STORE
+from .query_cache import invalidate_docs
+from .vectorize import (
+    ACCESS_LOG,
+    CHROMA_DIR,
+    CHROMA_POOL,
+    EXACT_DIR,
+    INDEX_DIR,
+    VERSIONS_DIR,
+    _BUILDING,
+    _RETIRED,
+    _chunk_ids,
+    _load_manifest,
+    _save_manifest,
+    _slot_lock,
+    chroma_collection,
+    exact_index_dir,
+    live_doc_hashes,
+    live_index_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = BLOB_DIR.parent
+LEGACY_INDEX_NAME = re.compile(r"^[0-9a-f]{16}$")
+DEFAULT_MIN_IDLE_SECONDS = 3600
+DEFAULT_INTERVAL_SECONDS = 6 * 3600
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+def _idle(last: Optional[float], mtime: float, now: float, min_idle_seconds: float) -> bool:
+    return now - max(last or 0.0, mtime) >= min_idle_seconds
+
+
+def _remove_dir(path: Path, dry_run: bool) -> Dict[str, Any]:
+    entry = {"path": str(path), "bytes": dir_bytes(path)}
+    if not dry_run:
+        shutil.rmtree(path, ignore_errors=True)
+    return entry
+
+
+def _legacy_indexes(now: float, min_idle_seconds: float, dry_run: bool) -> List[Dict[str, Any]]:
+    """Per-dataset Chroma folders from before the shared index; nothing opens them any more."""
+    if not CHROMA_DIR.exists():
+        return []
+    return [
+        _remove_dir(p, dry_run) for p in sorted(CHROMA_DIR.iterdir())
+        if p.is_dir() and LEGACY_INDEX_NAME.match(p.name)
+        and _idle(None, p.stat().st_mtime, now, min_idle_seconds)
+    ]
+
+
+def _orphan_uploads(live_sessions: Optional[set], now: float, min_idle_seconds: float, dry_run: bool) -> List[Dict[str, Any]]:
+    """uploads/<session_id> folders of sessions that aren't live (without a live list: idle ones)."""
+    if not UPLOAD_DIR.exists():
+        return []
+    out = []
+    for p in sorted(UPLOAD_DIR.iterdir()):
+        if not p.is_dir() or p == BLOB_DIR:
+            continue
+        if live_sessions is not None and p.name in live_sessions:
+            continue
+        # grace period: a session being created right now isn't registered yet
+        if _idle(None, p.stat().st_mtime, now, min_idle_seconds):
+            out.append(_remove_dir(p, dry_run))
+    return out
+
+
+def _exact_indexes(
+    indexed_docs: set,
+    keep_docs: set,
+    budget_bytes: Optional[int],
+    now: float,
+    min_idle_seconds: float,
+    dry_run: bool,
+) -> List[Dict[str, Any]]:
+    """Exact indexes whose documents left the shared index, then LRU down to budget_bytes."""
+    if not EXACT_DIR.exists():
+        return []
+    access = ACCESS_LOG.snapshot("exact")
+    candidates = []
+    for p in EXACT_DIR.iterdir():
+        if not p.is_dir():
+            continue
+        if p.name.startswith("."):
+            # leftover of an interrupted build
+            if _idle(None, p.stat().st_mtime, now, min_idle_seconds):
+                candidates.append((0.0, p, "partial"))
+            continue
+        try:
+            metadatas = json.loads((p / "docs.json").read_text(encoding="utf-8"))["metadatas"]
+        except (FileNotFoundError, ValueError, KeyError):
+            metadatas = []
+        docs = {m.get("doc_hash") for m in metadatas}
+        if docs & keep_docs or not _idle(access.get(p.name), p.stat().st_mtime, now, min_idle_seconds):
+            continue
+        # exported from an index version that has since been swapped out: never opened again
+        current = exact_index_dir(live_index_dir(INDEX_DIR), docs).name == p.name
+        reason = "stale" if not docs <= indexed_docs or not current else "lru"
+        candidates.append((access.get(p.name) or p.stat().st_mtime, p, reason))
+
+    removed = [dict(_remove_dir(p, dry_run), reason=r) for _, p, r in candidates if r != "lru"]
+    if budget_bytes is not None:
+        total = sum(dir_bytes(p) for p in EXACT_DIR.iterdir() if p.is_dir()) - sum(e["bytes"] for e in removed)
+        for _last, p, _reason in sorted((c for c in candidates if c[2] == "lru"), key=lambda c: c[0]):
+            if total <= budget_bytes:
+                break
+            entry = dict(_remove_dir(p, dry_run), reason="lru")
+            total -= entry["bytes"]
+            removed.append(entry)
+    if not dry_run:
+        ACCESS_LOG.forget("exact", [Path(e["path"]).name for e in removed])
+    return removed
+
+
+def _stale_versions(now: float, min_idle_seconds: float, dry_run: bool) -> List[Dict[str, Any]]:
+    """
+    Versions under any slot that aren't live, aren't open and haven't been written for
+    min_idle_seconds (a rebuild still in progress keeps writing to its version).
+    """
+    if not CHROMA_DIR.exists():
+        return []
+    out = []
+    for versions in sorted(CHROMA_DIR.glob(f"*/{VERSIONS_DIR}")):
+        slot = versions.parent
+        with _slot_lock(slot):
+            live = live_index_dir(slot)
+            for p in sorted(versions.iterdir()):
+                if not p.is_dir() or p == live or CHROMA_POOL.refs(str(p)) > 0 or str(p) in _RETIRED or str(p) in _BUILDING:
+                    continue
+                last_write = max((f.stat().st_mtime for f in p.rglob("*")), default=p.stat().st_mtime)
+                if _idle(None, last_write, now, min_idle_seconds):
+                    out.append(_remove_dir(p, dry_run))
+    return out
+
+
+def _compact_sqlite(persist_dir: Path) -> bool:
+    """VACUUMs Chroma's SQLite file when nobody in this process has the index open."""
+    db_file = persist_dir / "chroma.sqlite3"
+    if not db_file.exists() or CHROMA_POOL.refs(str(persist_dir)) > 0:
+        return False
+    con = sqlite3.connect(db_file)
+    try:
+        con.execute("VACUUM")
+    finally:
+        con.close()
+    return True
+
+
+def _evict_documents(
+    keep_docs: set,
+    budget_bytes: int,
+    now: float,
+    min_idle_seconds: float,
+    dry_run: bool,
+) -> Dict[str, Any]:
+    """Removes least recently used documents from the shared index until it fits budget_bytes."""
+    with _slot_lock(INDEX_DIR):
+        index_dir = live_index_dir(INDEX_DIR)
+        manifest = _load_manifest(index_dir)
+        size = dir_bytes(index_dir) if index_dir.exists() else 0
+        total_chunks = sum(manifest["chunks"].values())
+        result: Dict[str, Any] = {"index_bytes": size, "budget_bytes": budget_bytes, "evicted": [], "compacted": False}
+        if size <= budget_bytes or not total_chunks:
+            return result
+
+        access = ACCESS_LOG.snapshot("docs")
+        bytes_per_chunk = size / total_chunks
+        projected = size
+        evict: List[str] = []
+        for h in sorted(manifest["chunks"], key=lambda h: access.get(h) or 0.0):
+            if projected <= budget_bytes:
+                break
+            # documents never opened since access tracking started count as idle
+            if h in keep_docs or not _idle(access.get(h), 0.0, now, min_idle_seconds):
+                continue
+            evict.append(h)
+            projected -= manifest["chunks"][h] * bytes_per_chunk
+            result["evicted"].append({"doc_hash": h, "chunks": manifest["chunks"][h], "last_access": access.get(h)})
+
+        if dry_run or not evict:
+            return result
+
+        delete_ids = [i for h in evict for i in _chunk_ids(h, manifest["chunks"][h])]
+        with chroma_collection(index_dir) as db:
+            db.delete(ids=delete_ids)
+        for h in evict:
+            manifest["chunks"].pop(h, None)
+        manifest["docs"] = {d: h for d, h in manifest["docs"].items() if h not in evict}
+        # a dataset missing a document is incomplete; its next build_retriever re-registers it
+        manifest["datasets"] = {
+            ds: hashes for ds, hashes in manifest["datasets"].items() if not set(hashes) & set(evict)
+        }
+        _save_manifest(index_dir, manifest)
+        invalidate_docs(evict)
+        ACCESS_LOG.forget("docs", evict)
+        result["compacted"] = _compact_sqlite(index_dir)
+        result["index_bytes_after"] = dir_bytes(index_dir)
+    return result
+
+
+def collect_garbage(
+    live_sessions: Optional[Iterable[str]] = None,
+    dry_run: bool = True,
+    index_budget_mb: Optional[float] = None,
+    exact_budget_mb: Optional[float] = None,
+    min_idle_seconds: float = DEFAULT_MIN_IDLE_SECONDS,
+    index_dry_run: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    One GC pass; returns what was (or, with dry_run, would be) removed.
+
+    live_sessions: ids of sessions that still exist (API process). None (CLI) = only
+        upload folders idle for min_idle_seconds are treated as orphaned.
+    index_budget_mb / exact_budget_mb: LRU size budgets for the shared index and the exact
+        indexes (None = no size-based eviction).
+    index_dry_run: Report-only for index folders, exact indexes and documents while uploads
+        and blobs follow dry_run (default: dry_run). Outside the serving process this must be
+        True: another process's open Chroma store can't be modified safely from here.
+    """
+    now = time.time()
+    index_dry_run = dry_run if index_dry_run is None else index_dry_run
+    live = set(live_sessions) if live_sessions is not None else None
+    keep_docs = live_doc_hashes()
+    indexed_docs = set(_load_manifest(live_index_dir(INDEX_DIR))["chunks"])
+    report: Dict[str, Any] = {"dry_run": dry_run, "index_dry_run": index_dry_run, "started_at": now}
+
+    report["legacy_indexes"] = _legacy_indexes(now, min_idle_seconds, index_dry_run)
+    report["index_versions"] = _stale_versions(now, min_idle_seconds, index_dry_run)
+    report["uploads"] = _orphan_uploads(live, now, min_idle_seconds, dry_run)
+    report["blobs"] = BLOB_STORE.gc(live_sessions=live, dry_run=dry_run, min_age_seconds=min_idle_seconds)["removed"]
+    report["exact_indexes"] = _exact_indexes(
+        indexed_docs,
+        keep_docs,
+        int(exact_budget_mb * 1024 * 1024) if exact_budget_mb is not None else None,
+        now,
+        min_idle_seconds,
+        index_dry_run,
+    )
+    if index_budget_mb is not None:
+        report["documents"] = _evict_documents(keep_docs, int(index_budget_mb * 1024 * 1024), now, min_idle_seconds, index_dry_run)
+
+    report["freed_bytes"] = sum(
+        e["bytes"] for k in ("legacy_indexes", "index_versions", "uploads", "exact_indexes") for e in report[k]
+    )
+    report["seconds"] = round(time.time() - now, 3)
+    if not index_dry_run:
+        ACCESS_LOG.flush()
+    return report
+
+
+def start_gc_thread(
+    live_sessions_fn,
+    interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+    **kwargs: Any,
+) -> threading.Thread:
+    """Runs collect_garbage(dry_run=False) every interval_seconds in a daemon thread."""
+    def loop() -> None:
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                report = collect_garbage(live_sessions=live_sessions_fn(), dry_run=False, **kwargs)
+                logger.info("GC freed %s bytes", report["freed_bytes"])
+            except Exception:
+                logger.exception("GC pass failed")
+
+    thread = threading.Thread(target=loop, name="index-gc", daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Garbage-collect vector indexes and uploads.")
+    parser.add_argument("--apply", action="store_true", help="Delete orphaned uploads and blobs (default: dry-run report only)")
+    parser.add_argument("--index-budget-mb", type=float, default=None, help="LRU size budget for the shared index")
+    parser.add_argument("--exact-budget-mb", type=float, default=None, help="LRU size budget for exact indexes")
+    parser.add_argument("--min-idle-seconds", type=float, default=DEFAULT_MIN_IDLE_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    report = collect_garbage(
+        dry_run=not args.apply,
+        index_budget_mb=args.index_budget_mb,
+        exact_budget_mb=args.exact_budget_mb,
+        min_idle_seconds=args.min_idle_seconds,
+        # the serving process may have these stores open: report, never modify
+        index_dry_run=True,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
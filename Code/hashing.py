@@ -0,0 +1,21 @@
+# Code/hashing.py
+# Content hashing helpers shared by the caches (same bytes => same key, whatever the filename).
+import hashlib
+from pathlib import Path
+from typing import Union
+
+_READ_BLOCK = 1024 * 1024
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """Returns the hex SHA-256 of a file's bytes, read in 1 MB blocks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """Returns the hex SHA-256 of a UTF-8 string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
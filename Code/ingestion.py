@@ -1,11 +1,24 @@
 # ingestion.py (STEP 1) — accept PDFs + CSVs, return (csv_paths, pdf_paths)
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pypdf import PdfReader
 
-def ingest_files(paths: List[str]) -> Tuple[List[str], List[str]]:
+from .hashing import file_sha256
+from .pdf_to_markdown import convert_pdfs
+
+# Per-session PDF cap; larger libraries go through bulk mode (Code/bulk_ingest.py)
+MAX_SESSION_PDFS = 6
+
+
+def ingest_files(paths: List[str], validate_pdfs: bool = True, bulk: bool = False) -> Tuple[List[str], List[str]]:
     """
     Splits input paths into CSVs + PDFs.
+    With validate_pdfs=False the pypdf readability check is skipped
+    (use ingest_pdfs afterwards, which validates while converting).
+    With bulk=True there is no PDF count limit (pair it with bulk_ingest).
     Returns: (csv_paths, pdf_paths)
     """
     csv_paths: List[str] = []
@@ -20,8 +33,13 @@ def ingest_files(paths: List[str]) -> Tuple[List[str], List[str]]:
         else:
             raise ValueError(f"Unsupported file type: {ext} for path: {p}")
 
-    if len(pdf_paths) > 6:
-        raise ValueError("Maximum 6 PDFs allowed")
+    if not bulk and len(pdf_paths) > MAX_SESSION_PDFS:
+        raise ValueError(
+            f"Maximum {MAX_SESSION_PDFS} PDFs allowed per session; use bulk ingestion for larger libraries"
+        )
+
+    if not validate_pdfs:
+        return csv_paths, pdf_paths
 
     # Validate PDFs (keep only usable ones)
     valid_pdfs, errors, is_usable = valid_pdf(pdf_paths)
@@ -33,39 +51,187 @@ def ingest_files(paths: List[str]) -> Tuple[List[str], List[str]]:
     return csv_paths, [str(p) for p in valid_pdfs]
 
 
+# Preflight verdict cache: (content hash, settings) -> report. Same bytes => same verdict.
+# LRU-bounded: a bulk run over a large library would otherwise keep every report forever.
+_PREFLIGHT_CACHE: "OrderedDict[Tuple, Dict]" = OrderedDict()
+_PREFLIGHT_CACHE_SIZE = 4096
+_PREFLIGHT_LOCK = threading.Lock()
+
+
+def _sample_pages(page_count: int, max_pages: int) -> List[int]:
+    """First page, last page, middle page, then evenly spaced pages (0-based, no repeats)."""
+    if page_count <= max_pages:
+        return list(range(page_count))
+    order = [0, page_count - 1, page_count // 2]
+    step = page_count / max_pages
+    order.extend(int(k * step) for k in range(1, max_pages))
+    seen, picked = set(), []
+    for idx in order:
+        if idx not in seen:
+            seen.add(idx)
+            picked.append(idx)
+    return picked[:max_pages]
+
+
+def preflight_pdf(
+    pdf_path: str,
+    min_characters: int = 20,
+    max_sample_pages: int = 8,
+    scanned_page_chars: int = 20,
+) -> Dict:
+    """
+    Cheap readability check on a sample of pages, stopping as soon as min_characters is reached.
+    Returns a report: {"file", "sha256", "valid", "error", "page_count", "sampled_pages",
+    "text_chars", "chars_per_page", "likely_scanned_pages", "cached"}.
+    chars_per_page and likely_scanned_pages describe the sampled pages only, and sampling
+    stops once min_characters is reached (often after the first page). They are not
+    document-wide statistics: a PDF with a few scanned pages can pass with none listed.
+    """
+    pdf_path = Path(pdf_path)
+    report: Dict = {
+        "file": str(pdf_path),
+        "sha256": None,
+        "valid": False,
+        "error": None,
+        "page_count": 0,
+        "sampled_pages": [],
+        "text_chars": 0,
+        "chars_per_page": 0.0,
+        "likely_scanned_pages": [],
+        "cached": False,
+    }
+
+    try:
+        if pdf_path.stat().st_size == 0:
+            raise ValueError("empty file (0 bytes)")
+        report["sha256"] = file_sha256(pdf_path)
+    except Exception as e:
+        report["error"] = str(e)
+        return report
+
+    key = (report["sha256"], min_characters, max_sample_pages, scanned_page_chars)
+    with _PREFLIGHT_LOCK:
+        cached = _PREFLIGHT_CACHE.get(key)
+        if cached is not None:
+            _PREFLIGHT_CACHE.move_to_end(key)
+    if cached is not None:
+        return dict(cached, file=str(pdf_path), cached=True)
+
+    try:
+        reader = PdfReader(pdf_path)
+        page_count = len(reader.pages)
+        report["page_count"] = page_count
+        if page_count == 0:
+            raise ValueError("no pages")
+
+        text_chars = 0
+        for idx in _sample_pages(page_count, max_sample_pages):
+            page_chars = len((reader.pages[idx].extract_text() or "").strip())
+            report["sampled_pages"].append(idx + 1)
+            if page_chars < scanned_page_chars:
+                report["likely_scanned_pages"].append(idx + 1)
+            text_chars += page_chars
+            # early exit: the verdict can't change once enough text was seen
+            if text_chars >= min_characters:
+                break
+
+        report["text_chars"] = text_chars
+        report["chars_per_page"] = round(text_chars / len(report["sampled_pages"]), 1)
+        if text_chars < min_characters:
+            raise ValueError("no readable text (likely scanned PDF)")
+
+        report["valid"] = True
+    except Exception as e:
+        report["error"] = str(e)
+
+    with _PREFLIGHT_LOCK:
+        _PREFLIGHT_CACHE[key] = dict(report)
+        _PREFLIGHT_CACHE.move_to_end(key)
+        while len(_PREFLIGHT_CACHE) > _PREFLIGHT_CACHE_SIZE:
+            _PREFLIGHT_CACHE.popitem(last=False)
+    return report
+
+
+def preflight_pdfs(pdf_paths: List[str], min_characters: int = 20, max_workers: int = 4, **kwargs) -> List[Dict]:
+    """Runs preflight_pdf over many files in parallel threads; reports keep input order."""
+    if not pdf_paths:
+        return []
+    workers = max(1, min(max_workers, len(pdf_paths)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda p: preflight_pdf(p, min_characters=min_characters, **kwargs), pdf_paths))
+
+
 def valid_pdf(pdf_paths: List[str], min_characters: int = 20):
     """
-    Validates PDFs for extractable text and usability.
+    Validates PDFs for extractable text and usability (sampled preflight, see preflight_pdf).
     """
     valid_pdfs = []
     errors = []
 
-    for pdf_path in pdf_paths:
-        pdf_path = Path(pdf_path)
-
-        try:
-            if pdf_path.stat().st_size == 0:
-                raise ValueError("empty file (0 bytes)")
+    for report in preflight_pdfs(pdf_paths, min_characters=min_characters):
+        if report["valid"]:
+            valid_pdfs.append(Path(report["file"]))
+        else:
+            errors.append({"file": report["file"], "error": report["error"]})
 
-            reader = PdfReader(pdf_path)
-            if len(reader.pages) == 0:
-                raise ValueError("no pages")
+    is_usable = len(valid_pdfs) > 0
+    return valid_pdfs, errors, is_usable
 
-            total_text = ""
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    total_text += text
 
-            if len(total_text.strip()) < min_characters:
+def ingest_pdfs(
+    pdf_paths: List[str],
+    output_dir: str,
+    min_characters: int = 20,
+    workers: int = 1,
+    preflight: bool = False,
+    stream_window_pages: Optional[int] = None,
+) -> Tuple[List[Path], List[Dict], bool, Dict[str, str], List[Dict]]:
+    """
+    Single-pass PDF stage: each PDF is parsed once by Docling and that one parse yields
+    the validity verdict, per-page text statistics and the Markdown file.
+    With preflight=True, PDFs failing the cheap sampled preflight never reach Docling;
+    the preflight report is attached to each result under "preflight".
+    stream_window_pages enables windowed conversion for long PDFs (see convert_pdfs).
+    Returns: (md_paths, errors, is_usable, md_to_pdf, reports)
+    """
+    md_paths: List[Path] = []
+    errors: List[Dict] = []
+    md_to_pdf: Dict[str, str] = {}
+    reports: List[Dict] = []
+
+    preflight_by_file: Dict[str, Dict] = {}
+    if preflight:
+        for pre in preflight_pdfs(pdf_paths, min_characters=min_characters):
+            preflight_by_file[pre["file"]] = pre
+            if not pre["valid"]:
+                errors.append({"file": pre["file"], "error": pre["error"]})
+                reports.append({"file": pre["file"], "valid": False, "error": pre["error"], "preflight": pre})
+        pdf_paths = [p for p in pdf_paths if preflight_by_file[str(Path(p))]["valid"]]
+
+    records = convert_pdfs(
+        pdf_paths, Path(output_dir), workers=workers, stream_window_pages=stream_window_pages,
+    ) if pdf_paths else []
+
+    for rec in records:
+        report = dict(rec, valid=False)
+        if rec["file"] in preflight_by_file:
+            report["preflight"] = preflight_by_file[rec["file"]]
+        try:
+            if not rec["ok"]:
+                raise ValueError(rec["error"])
+            if rec["page_count"] == 0:
+                raise ValueError("no pages")
+            # text_chars is None when the Markdown was reused without stats
+            if rec["text_chars"] is not None and rec["text_chars"] < min_characters:
                 raise ValueError("no readable text (likely scanned PDF)")
 
-            valid_pdfs.append(pdf_path)
-
+            report["valid"] = True
+            md_paths.append(rec["md_path"])
+            md_to_pdf[rec["md_path"].name] = Path(rec["file"]).name
         except Exception as e:
-            errors.append({"file": str(pdf_path), "error": str(e)})
-
-    is_usable = len(valid_pdfs) > 0
-    return valid_pdfs, errors, is_usable
-
+            report["error"] = str(e)
+            errors.append({"file": rec["file"], "error": str(e)})
+        reports.append(report)
 
+    is_usable = len(md_paths) > 0
+    return md_paths, errors, is_usable, md_to_pdf, reports
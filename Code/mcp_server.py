@@ -2,13 +2,18 @@
 # Run (stdio): python -m Code.mcp_server
 # Or run directly: python Code/mcp_server.py
 import os
+import time
 import uuid
 import shutil
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional
 
 from mcp.server.fastmcp import FastMCP
 
-from .app_langgraph import graph, build_runtime_from_paths, AppState
+from .app_langgraph import graph, build_sql_runtime, build_docs_runtime, decide_mode, AppState
+from .blob_store import BLOB_STORE
+from .pdf_to_markdown import warm_converter
+from .vectorize import release_retriever, warm_reranker
 
 mcp = FastMCP(name="bi-agent-mcp")
 
@@ -18,12 +23,73 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # In-memory session store (good enough for assessment)
 SESSIONS: Dict[str, Dict[str, Any]] = {}
 
+# Background ingestion: each session gets one "sql" job (DuckDB) and one "docs" job
+# (Docling + Chroma) so a session is usable as soon as the component it needs is ready.
+# SQL loads run on their own executor so they never queue behind long PDF conversions.
+SQL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ingest-sql")
+INGEST_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ingest")
+JOBS: Dict[str, Dict[str, Any]] = {}
 
-def _write_bytes(path: str, data: bytes) -> str:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "wb") as f:
-        f.write(data)
-    return path
+# component states that won't change any more
+TERMINAL_STATES = ("ready", "skipped", "failed")
+
+
+def _store_upload(session_id: str, path: str, data: bytes, digests: Dict[str, str]) -> str:
+    # identical uploads share one blob; the session folder just links to it
+    digest = BLOB_STORE.put(data, session_id)
+    digests[os.path.basename(path)] = digest
+    return BLOB_STORE.link(digest, path)
+
+
+def _set_state(session_id: str, component: str, state: str, **extra: Any) -> None:
+    status = SESSIONS[session_id]["status"][component]
+    status["state"] = state
+    status.update(extra)
+    if state in TERMINAL_STATES and status.get("started_at"):
+        status["seconds"] = round(time.time() - status["started_at"], 2)
+
+
+def _run_sql_job(session_id: str, customers_path: str, tickets_path: str) -> None:
+    rt = SESSIONS[session_id]
+    _set_state(session_id, "sql", "loading", started_at=time.time())
+    try:
+        con, table_name, type_schema, warnings = build_sql_runtime(customers_path, tickets_path)
+    except Exception as e:
+        _set_state(session_id, "sql", "failed", error=str(e))
+        return
+    rt.update(con=con, table_name=table_name, type_schema=type_schema, warnings=warnings)
+    _set_state(session_id, "sql", "ready")
+
+
+def _run_docs_job(session_id: str, pdf_paths: List[str], session_dir: str, pdf_workers: int = 1) -> None:
+    rt = SESSIONS[session_id]
+    rt["status"]["docs"]["started_at"] = time.time()
+    try:
+        retriever, md_to_pdf = build_docs_runtime(
+            pdf_paths,
+            session_dir,
+            pdf_workers=pdf_workers,
+            on_stage=lambda stage: _set_state(session_id, "docs", stage),
+        )
+    except Exception as e:
+        _set_state(session_id, "docs", "failed", error=str(e))
+        return
+    rt.update(retriever=retriever, md_to_pdf=md_to_pdf)
+    _set_state(session_id, "docs", "ready")
+
+
+def _status_view(session_id: str) -> Dict[str, Any]:
+    rt = SESSIONS[session_id]
+    components = {
+        name: {k: v for k, v in comp.items() if k != "started_at"}
+        for name, comp in rt["status"].items()
+    }
+    return {
+        "session_id": session_id,
+        "ready": all(c["state"] in ("ready", "skipped") for c in components.values()),
+        "components": components,
+        "warnings": rt.get("warnings") or [],
+    }
 
 
 @mcp.tool()
@@ -31,47 +97,121 @@ def create_session(
     customers_csv_bytes: bytes,
     tickets_csv_bytes: bytes,
     pdf_files: Optional[List[Dict[str, Any]]] = None,
+    background: bool = True,
+    pdf_workers: int = 1,
 ) -> Dict[str, Any]:
     """
-    Upload files once and build runtime (DuckDB + retriever).
-    Returns session_id to reuse for subsequent questions.
+    Upload files once and start building the runtime (DuckDB + retriever).
+    With background=True (default) this returns immediately; poll session_status
+    for per-component progress. pdf_workers > 1 converts the PDFs in parallel worker
+    processes (at most pdf_to_markdown.MAX_PDF_WORKERS). Returns session_id to reuse for
+    subsequent questions.
     """
     session_id = str(uuid.uuid4())[:8]
     session_dir = os.path.join(UPLOAD_DIR, session_id)
     os.makedirs(session_dir, exist_ok=True)
 
-    customers_path = _write_bytes(os.path.join(session_dir, "customers.csv"), customers_csv_bytes)
-    tickets_path = _write_bytes(os.path.join(session_dir, "tickets.csv"), tickets_csv_bytes)
+    # filename -> content sha256, reusable as a cache key by later stages
+    upload_digests: Dict[str, str] = {}
+    # registered before any blob is stored, so GC never sees its blobs as unreferenced
+    SESSIONS[session_id] = {
+        "retriever": None,
+        "con": None,
+        "table_name": None,
+        "type_schema": {},
+        "warnings": [],
+        "md_to_pdf": {},
+        "session_dir": session_dir,
+        "uploads": upload_digests,
+        "status": {
+            "sql": {"state": "pending", "error": None, "seconds": None},
+            "docs": {
+                "state": "pending" if pdf_files else "skipped",
+                "error": None,
+                "seconds": None,
+                "pdfs": len(pdf_files or []),
+            },
+        },
+    }
+
+    customers_path = _store_upload(session_id, os.path.join(session_dir, "customers.csv"), customers_csv_bytes, upload_digests)
+    tickets_path = _store_upload(session_id, os.path.join(session_dir, "tickets.csv"), tickets_csv_bytes, upload_digests)
 
     pdf_paths: List[str] = []
     for i, item in enumerate(pdf_files or []):
-        fname = item.get("filename") or f"policy_{i+1}.pdf"
+        fname = os.path.basename(item.get("filename") or f"policy_{i+1}.pdf")
         data  = item.get("bytes") or b""
-        pdf_paths.append(_write_bytes(os.path.join(session_dir, fname), data))
+        pdf_paths.append(_store_upload(session_id, os.path.join(session_dir, fname), data, upload_digests))
 
-    retriever, con, table_name, type_schema, warnings,md_to_pdf = build_runtime_from_paths(
-        customers_csv=customers_path,
-        tickets_csv=tickets_path,
-        pdf_paths=pdf_paths,
-        doc_dir=session_dir,
-    )
+    JOBS[session_id] = {"sql": SQL_POOL.submit(_run_sql_job, session_id, customers_path, tickets_path)}
+    if pdf_paths:
+        JOBS[session_id]["docs"] = INGEST_POOL.submit(_run_docs_job, session_id, pdf_paths, session_dir, pdf_workers)
 
-    SESSIONS[session_id] = {
-        "retriever": retriever,
-        "con": con,
-        "table_name": table_name,
-        "type_schema": type_schema,
-        "warnings": warnings,
-        "md_to_pdf": md_to_pdf,
-    }
+    if not background:
+        wait_for_session(session_id)
 
     return {
         "session_id": session_id,
-        "warnings": warnings or [],
+        "job": session_id,
+        "warnings": SESSIONS[session_id]["warnings"] or [],
         "has_docs": bool(pdf_paths),
+        "status": _status_view(session_id)["components"],
     }
 
 
+@mcp.tool()
+def session_status(session_id: str) -> Dict[str, Any]:
+    """
+    Per-component ingestion progress for a session:
+    sql: pending -> loading -> ready | failed
+    docs: pending -> converting -> indexing -> ready | failed (skipped when no PDFs)
+    """
+    if session_id not in SESSIONS:
+        return {
+            "error": "INVALID_SESSION",
+            "message": "Session not found. Call create_session first.",
+        }
+    return _status_view(session_id)
+
+
+def wait_for_session(
+    session_id: str,
+    components: Iterable[str] = ("sql", "docs"),
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Blocks until the given components finish building (or timeout); returns session_status."""
+    futures = [JOBS.get(session_id, {}).get(c) for c in components]
+    wait([f for f in futures if f is not None], timeout=timeout)
+    return session_status(session_id)
+
+
+@mcp.tool()
+def close_session(session_id: str) -> Dict[str, Any]:
+    """
+    Ends a session: closes its DuckDB connection, releases its shared retriever (the index
+    closes when no other session uses it), removes its upload folder and releases its blob
+    references (blobs no other session uses are deleted).
+    """
+    if session_id not in SESSIONS:
+        return {
+            "error": "INVALID_SESSION",
+            "message": "Session not found. Call create_session first.",
+        }
+
+    # let in-flight ingestion finish before tearing the session down
+    wait_for_session(session_id)
+    rt = SESSIONS.pop(session_id)
+    JOBS.pop(session_id, None)
+
+    if rt.get("con") is not None:
+        rt["con"].close()
+    release_retriever(rt.get("retriever"))
+    shutil.rmtree(rt["session_dir"], ignore_errors=True)
+    freed = BLOB_STORE.release(session_id)
+
+    return {"session_id": session_id, "closed": True, "blobs_freed": len(freed)}
+
+
 @mcp.tool()
 def ask(
     session_id: str,
@@ -79,6 +219,8 @@ def ask(
 ) -> Dict[str, Any]:
     """
     Ask a question using an existing session runtime.
+    Questions are routed once DuckDB is loaded (routing reads the table schema); docs
+    questions additionally wait for the retriever.
     Returns structured output (answer + metadata).
     """
     if session_id not in SESSIONS:
@@ -88,6 +230,16 @@ def ask(
         }
 
     rt = SESSIONS[session_id]
+    status = rt["status"]
+
+    # routing reads the table schema: until DuckDB is loaded the mode can't be decided
+    if status["sql"]["state"] not in TERMINAL_STATES:
+        return {
+            "error": "SESSION_NOT_READY",
+            "message": "Still building: sql. Poll session_status and retry.",
+            "mode": None,
+            "status": _status_view(session_id)["components"],
+        }
 
     initial_state: AppState = {
         "question": question,
@@ -102,6 +254,30 @@ def ask(
         "md_to_pdf": rt.get("md_to_pdf", {}),
     }
 
+    # Only wait on what this question actually needs
+    mode = decide_mode(initial_state)["mode"]
+    needed = {"sql_only": ["sql"], "docs_only": ["docs"], "hybrid": ["sql", "docs"]}.get(mode, ["sql", "docs"])
+    pending = [c for c in needed if status[c]["state"] not in TERMINAL_STATES]
+    if pending:
+        return {
+            "error": "SESSION_NOT_READY",
+            "message": f"Still building: {', '.join(pending)}. Poll session_status and retry.",
+            "mode": mode,
+            "status": _status_view(session_id)["components"],
+        }
+    if "sql" in needed and status["sql"]["state"] == "failed":
+        return {
+            "error": "SQL_INGESTION_FAILED",
+            "message": status["sql"]["error"],
+            "mode": mode,
+        }
+    if "docs" in needed and status["docs"]["state"] == "failed":
+        return {
+            "error": "DOCS_INGESTION_FAILED",
+            "message": status["docs"]["error"],
+            "mode": mode,
+        }
+
     result: Dict[str, Any] = graph.invoke(initial_state)
 
     sql_output = result.get("sql_output") or {}
@@ -122,9 +298,12 @@ def ask(
 
 
 def main():
+    # load Docling models once up front so the first session doesn't pay for it
+    print(f"--- Docling converter warmed in {warm_converter():.2f}s ---")
+    print(f"--- Reranker warmed in {warm_reranker():.2f}s ---")
     # stdio transport
     mcp.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
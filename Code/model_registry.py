@@ -0,0 +1,92 @@
+# Code/model_registry.py
+# Process-wide registry of heavy models: each one is loaded lazily on first use,
+# exactly once (thread-safe), and shared by every session in the process.
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KiB on Linux/BSD
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def _mb(n: Optional[int]) -> Optional[float]:
+    return round(n / (1024 * 1024), 1) if n is not None else None
+
+
+class ModelRegistry:
+    """Lazily builds and caches named models, recording load time and resident memory added."""
+
+    def __init__(self) -> None:
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Registers a zero-argument loader. Nothing is loaded until get()/warm()."""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Returns the shared instance, loading it on first call."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        # double-checked so concurrent first callers load only once
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                rss_before = process_rss_bytes()
+                t0 = time.perf_counter()
+                model = self._loaders[name]()
+                rss_after = process_rss_bytes()
+                self._stats[name] = {
+                    "load_seconds": round(time.perf_counter() - t0, 3),
+                    "loaded_at": time.time(),
+                    # approximate: other threads allocating during the load are counted too
+                    "rss_delta_mb": _mb(rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+                }
+                self._models[name] = model
+        return model
+
+    def warm(self, name: str) -> float:
+        """Loads a model ahead of time (e.g. at server start) and returns its load time."""
+        self.get(name)
+        return self._stats[name]["load_seconds"]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model load status, first-load time and memory, plus current process RSS."""
+        return {
+            "process_rss_mb": _mb(process_rss_bytes()),
+            "models": {
+                name: {"loaded": name in self._models, **self._stats.get(name, {})}
+                for name in self._loaders
+            },
+        }
+
+
+MODEL_REGISTRY = ModelRegistry()
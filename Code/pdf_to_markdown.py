@@ -1,15 +1,24 @@
 from __future__ import annotations
 # Suppresses logging and warnings from Docling for cleaner output.
+import os
+import json
+import shutil
+import threading
 import time
 import logging
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Dict, Tuple, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
 from docling.document_converter import DocumentConverter
-import re
+from pypdf import PdfReader
 from pathlib import Path
 import warnings
 import logging
 
+from . import text_normalize
+from .hashing import file_sha256, text_sha256
+from .model_registry import MODEL_REGISTRY
+
 # 1. Suppress Python-level warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 
@@ -20,83 +29,414 @@ logging.getLogger("docling_core").setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+# Global Markdown cache shared by all sessions: <content hash + version>.md
+MD_CACHE_DIR = Path(__file__).resolve().parent.parent / "Data" / "md_cache"
+# Bump whenever clean_markdown changes so stale cached output is not reused
+CLEANER_VERSION = "1"
+# Default window for converting long PDFs page-range by page-range (see convert_pdfs)
+STREAM_WINDOW_PAGES = 20
+
+
+def _docling_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version("docling")
+    except Exception:
+        return "unknown"
+
+
+MD_CACHE_VERSION = f"docling-{_docling_version()}|cleaner-{CLEANER_VERSION}"
+
+
+def md_cache_key(pdf_path: Path, stream_window_pages: Optional[int] = None, stream_min_pages: int = 50) -> str:
+    """
+    Cache key = PDF content hash + converter/cleaner version + conversion mode (filename is
+    irrelevant). Windowed output differs from a whole-document conversion (sections and
+    tables can't span windows), so a PDF that _convert_pdf would stream is cached per window size.
+    """
+    mode = "whole"
+    if stream_window_pages and pdf_page_count(pdf_path) > stream_min_pages:
+        mode = f"window-{stream_window_pages}"
+    return text_sha256(f"{file_sha256(pdf_path)}|{MD_CACHE_VERSION}|{mode}")
+
+
+def md_cache_get(key: str) -> Optional[Dict]:
+    """Returns {"markdown", "page_count", "page_chars"} for a cached key, or None on a miss."""
+    try:
+        md_text = (MD_CACHE_DIR / f"{key}.md").read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    try:
+        stats = json.loads((MD_CACHE_DIR / f"{key}.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        stats = {}
+    return {
+        "markdown": md_text,
+        "page_count": stats.get("page_count"),
+        "page_chars": stats.get("page_chars"),
+    }
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def md_cache_put(key: str, converted: Dict, md_path: Optional[Path] = None) -> None:
+    """
+    Stores cleaned Markdown (+ page stats sidecar) atomically.
+    Streamed conversions carry no in-memory text; their md_path file is copied instead.
+    """
+    MD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    stats = {"page_count": converted.get("page_count"), "page_chars": converted.get("page_chars")}
+    _atomic_write(MD_CACHE_DIR / f"{key}.json", json.dumps(stats))
+    # markdown last: its presence is what marks the entry as a hit
+    target = MD_CACHE_DIR / f"{key}.md"
+    if converted.get("markdown") is None and md_path is not None:
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(md_path, tmp)
+        os.replace(tmp, target)
+    else:
+        _atomic_write(target, converted["markdown"])
+
+
+CONVERTER_MODEL = "docling_converter"
+
+
+def _load_converter() -> DocumentConverter:
+    converter = DocumentConverter()
+    # Docling loads layout/table models lazily on the first convert; pull that into the load
+    try:
+        from docling.datamodel.base_models import InputFormat
+        converter.initialize_pipeline(InputFormat.PDF)
+    except Exception as e:
+        logger.info("Converter pipeline will initialize on first use | %s", e)
+    return converter
+
+
+MODEL_REGISTRY.register(CONVERTER_MODEL, _load_converter)
+
+
+def get_converter() -> DocumentConverter:
+    """Returns the process-wide warm DocumentConverter (created on first call)."""
+    return MODEL_REGISTRY.get(CONVERTER_MODEL)
+
+
+def warm_converter() -> float:
+    """Pre-loads the shared converter (call at server start); returns load seconds."""
+    return MODEL_REGISTRY.warm(CONVERTER_MODEL)
+
 
 def clean_markdown(md_text: str) -> str:
-    """Cleans markdown text by fixing escapes, symbols, and spacing for improved readability."""
-    # 1. Fix Escape Characters (Crucial for SQL column names like sale_id)
-    text = md_text.replace(r"\_", "_")
-    
-    # 2. Normalize Math Symbols for LLM/Code Generation
-    text = text.replace("×", "*")
-    
-    # 3. Collapse multiple spaces/tabs into a single space
-    # (Fixes: "This    analytical  system" -> "This analytical system")
-    text = re.sub(r"[ \t]{2,}", " ", text)
-    
-    # 4. Fix "Punctuation Gaps" (Fixes: "csv   dataset.    No" -> "csv dataset. No")
-    text = re.sub(r"\s+([,.;:!?])", r"\1", text)
-    
-    # 5. Handle "Space-Collapse" (Just in case some sections were smushed)
-    text = re.sub(r'([:.!?])([a-zA-Z])', r'\1 \2', text)
-    
-    # 6. Formatting: remove trailing whitespace and excessive newlines
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-
-    return text.strip()
+    """
+    Cleans markdown text by fixing escapes, symbols, and spacing for improved readability:
+    1. '\\_' -> '_' (SQL column names like sale_id)  2. '×' -> '*'
+    3. collapse runs of spaces/tabs  4. drop whitespace before punctuation
+    5. space after ':.!?' before a letter  6. trailing blanks + 3+ newlines
+    The precompiled implementation lives in text_normalize.
+    """
+    return text_normalize.clean_markdown(md_text)
 
 
-def pdfs_to_markdown(
+def _init_worker() -> None:
+    """Process-pool initializer: each worker warms its own registry converter once."""
+    warm_converter()
+
+
+# Worker processes are expensive to start (each loads Docling's models), so one pool is kept
+# per process and shared by every conversion. It is created on first use and grown when a
+# caller asks for more workers; the old pool finishes its in-flight work and then exits.
+# Each worker holds its own Docling models, so the pool size is capped.
+MAX_PDF_WORKERS = max(1, min(4, os.cpu_count() or 1))
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _submit_conversions(workers: int, jobs: Dict[int, Tuple]) -> Dict[int, Future]:
+    """
+    Submits _convert_in_worker(*args) for each job to the shared pool, which gets at least
+    min(workers, MAX_PDF_WORKERS) warm worker processes. Submitting under _POOL_LOCK means a
+    concurrent caller growing the pool can't shut it down between lookup and submit.
+    """
+    global _POOL, _POOL_WORKERS
+    workers = max(1, min(workers, MAX_PDF_WORKERS))
+    with _POOL_LOCK:
+        # a crashed worker leaves the pool unusable: replace it
+        if _POOL is None or _POOL_WORKERS < workers or getattr(_POOL, "_broken", False):
+            if _POOL is not None:
+                # already-submitted conversions still finish
+                _POOL.shutdown(wait=False)
+            _POOL_WORKERS = max(workers, _POOL_WORKERS)
+            _POOL = ProcessPoolExecutor(max_workers=_POOL_WORKERS, initializer=_init_worker)
+        return {i: _POOL.submit(_convert_in_worker, *args) for i, args in jobs.items()}
+
+
+def _convert_in_worker(pdf_path: str, min_md_chars: int, md_path: str, stream_window_pages: Optional[int], stream_min_pages: int) -> Dict:
+    """Runs inside a pool worker and returns the converted record."""
+    return _convert_pdf(get_converter(), pdf_path, min_md_chars, Path(md_path), stream_window_pages, stream_min_pages)
+
+
+def _page_text_chars(document) -> Dict[int, int]:
+    """Counts text characters per page number from the Docling document's provenance info."""
+    page_chars = {page_no: 0 for page_no in (getattr(document, "pages", None) or {})}
+    for item, _level in document.iterate_items():
+        text = getattr(item, "text", None)
+        prov = getattr(item, "prov", None)
+        if not text or not prov:
+            continue
+        page_chars[prov[0].page_no] = page_chars.get(prov[0].page_no, 0) + len(text)
+    return page_chars
+
+
+def pdf_page_count(pdf_path: Path) -> int:
+    """Page count from the PDF page tree only (no text extraction)."""
+    return len(PdfReader(str(pdf_path)).pages)
+
+
+def iter_markdown_windows(
+    converter: DocumentConverter,
+    pdf_path: Path,
+    md_path: Path,
+    window_pages: int = 20,
+    page_count: Optional[int] = None,
+) -> Iterator[Dict]:
+    """
+    Streams a large PDF through Docling window_pages at a time. Each window's cleaned Markdown
+    is appended to md_path as soon as it is converted, then yielded as
+    {"start_page", "end_page", "page_count", "markdown", "page_chars": {page_no: chars}},
+    so only one window's document is ever held in memory. Chunking reads the finished md_path.
+    """
+    page_count = page_count or pdf_page_count(pdf_path)
+    with open(md_path, "w", encoding="utf-8") as f:
+        for start in range(1, page_count + 1, window_pages):
+            end = min(start + window_pages - 1, page_count)
+            result = converter.convert(str(pdf_path), page_range=(start, end))
+            window_md = clean_markdown(result.document.export_to_markdown())
+            page_chars = _page_text_chars(result.document)
+            # release the window's document before converting the next one
+            del result
+
+            if window_md:
+                if f.tell() > 0:
+                    f.write("\n\n")
+                f.write(window_md)
+                f.flush()
+
+            yield {
+                "start_page": start,
+                "end_page": end,
+                "page_count": page_count,
+                "markdown": window_md,
+                "page_chars": page_chars,
+            }
+
+
+def _convert_pdf(
+    converter: DocumentConverter,
+    pdf_path: str,
+    min_md_chars: int,
+    md_path: Optional[Path] = None,
+    stream_window_pages: Optional[int] = None,
+    stream_min_pages: int = 50,
+) -> Dict:
+    """
+    Parses a single PDF once with Docling and returns
+    {"markdown": cleaned text, "page_count": int, "page_chars": [chars per page]}.
+    PDFs longer than stream_min_pages are converted in windows straight into md_path instead;
+    the result then has "markdown": None and "streamed": True.
+    """
+    if stream_window_pages and md_path is not None:
+        page_count = pdf_page_count(Path(pdf_path))
+        if page_count > stream_min_pages:
+            chars_by_page: Dict[int, int] = {}
+            md_chars = 0
+            for window in iter_markdown_windows(converter, Path(pdf_path), md_path, stream_window_pages, page_count):
+                chars_by_page.update(window["page_chars"])
+                md_chars += len(window["markdown"])
+
+            if md_chars < min_md_chars:
+                raise ValueError("Markdown output too short/empty after conversion")
+            return {
+                "markdown": None,
+                "streamed": True,
+                "page_count": page_count,
+                "page_chars": [chars_by_page.get(n, 0) for n in range(1, page_count + 1)],
+            }
+
+    result = converter.convert(str(pdf_path))
+    md_text = result.document.export_to_markdown()
+
+    if len((md_text or "").strip()) < min_md_chars:
+        raise ValueError("Markdown output too short/empty after conversion")
+
+    chars_by_page = _page_text_chars(result.document)
+    page_count = len(chars_by_page)
+    return {
+        "markdown": clean_markdown(md_text),
+        "page_count": page_count,
+        "page_chars": [chars_by_page.get(n, 0) for n in range(1, page_count + 1)],
+    }
+
+
+def convert_pdfs(
     pdf_paths: List[Path],
     output_dir: Path,
     *,
     min_md_chars: int = 50,
     overwrite: bool = True,
-) -> Tuple[List[Path], List[Dict], bool, Dict[str, str]]:
+    workers: int = 1,
+    use_cache: bool = True,
+    stream_window_pages: Optional[int] = None,
+    stream_min_pages: int = 50,
+) -> List[Dict]:
     """
-    Converts PDFs to Markdown using Docling, with cleaning and error handling.
+    Converts PDFs to Markdown using Docling and returns one record per input, in input order:
+    {"file", "md_path", "ok", "error", "cached", "page_count", "page_chars", "text_chars"}.
+
+    With workers > 1 the PDFs are converted in the shared process pool (Docling is CPU-bound;
+    capped at MAX_PDF_WORKERS);
+    each worker keeps its own warm converter across calls and results come back in input order.
+    With use_cache, byte-identical PDFs are served from MD_CACHE_DIR instead of Docling.
+    With stream_window_pages, PDFs over stream_min_pages pages are converted in page windows
+    appended to their .md file (bounded memory, see iter_markdown_windows).
     """
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    converter = DocumentConverter()
+    pdf_paths = [Path(p) for p in pdf_paths]
+    md_targets = [output_dir / f"{p.stem}.md" for p in pdf_paths]
 
-    md_paths: List[Path] = []
-    errors: List[Dict] = []
-    md_to_pdf: Dict[str, str] = {}   
-    for pdf_path in pdf_paths:
-        pdf_path = Path(pdf_path)
-        md_path = output_dir / f"{pdf_path.stem}.md"
+    # index -> converted dict, skipped (None) or failure (Exception)
+    outcomes: Dict[int, object] = {}
+    cache_keys: Dict[int, str] = {}
+    cache_hits = set()
+    todo: List[int] = []
+    for i, md_path in enumerate(md_targets):
+        # if md exisist dont override
+        if md_path.exists() and not overwrite:
+            logger.info("Skipping (exists): %s", md_path)
+            outcomes[i] = None
+            continue
 
-        try:
-            # if md exisist dont override
-            if md_path.exists() and not overwrite:
-                logger.info("Skipping (exists): %s", md_path)
-                md_paths.append(md_path)
-                md_to_pdf[md_path.name] = pdf_path.name
+        if use_cache:
+            try:
+                cache_keys[i] = md_cache_key(pdf_paths[i], stream_window_pages, stream_min_pages)
+                cached = md_cache_get(cache_keys[i])
+            except Exception as e:  # unreadable file or PDF page tree: a per-file error
+                outcomes[i] = e
+                continue
+            if cached is not None:
+                logger.info("Markdown cache hit: %s", pdf_paths[i])
+                outcomes[i] = cached
+                cache_hits.add(i)
                 continue
 
-            logger.info("Converting → Markdown: %s", pdf_path)
-            t0 = time.time()
-
-            result = converter.convert(str(pdf_path))
-            md_text = result.document.export_to_markdown()
+        todo.append(i)
 
-            if len((md_text or "").strip()) < min_md_chars:
-                raise ValueError("Markdown output too short/empty after conversion")
+    t0 = time.time()
+    if workers > 1 and len(todo) > 1:
+        logger.info("Converting %d PDFs with up to %d worker processes", len(todo), min(workers, MAX_PDF_WORKERS))
+        futures = _submit_conversions(workers, {
+            i: (str(pdf_paths[i]), min_md_chars, str(md_targets[i]), stream_window_pages, stream_min_pages)
+            for i in todo
+        })
+        for i, fut in futures.items():
+            try:
+                outcomes[i] = fut.result()
+            except Exception as e:
+                outcomes[i] = e
+    elif todo:
+        converter = get_converter()
+        for i in todo:
+            logger.info("Converting → Markdown: %s", pdf_paths[i])
+            try:
+                outcomes[i] = _convert_pdf(
+                    converter, str(pdf_paths[i]), min_md_chars,
+                    md_targets[i], stream_window_pages, stream_min_pages,
+                )
+            except Exception as e:
+                outcomes[i] = e
 
-            # cleans and output md to md file
-            clean_md = clean_markdown(md_text)
-            md_path.write_text(clean_md, encoding="utf-8")
+    # fresh conversions go into the shared cache for every later session
+    for i in todo:
+        if i in cache_keys and isinstance(outcomes[i], dict):
+            try:
+                md_cache_put(cache_keys[i], outcomes[i], md_targets[i])
+            except OSError as e:
+                logger.warning("Could not cache markdown for %s | %s", pdf_paths[i], e)
 
-            dt = time.time() - t0
-            logger.info("Saved: %s (%.2fs)", md_path, dt)
+    records: List[Dict] = []
+    for i, (pdf_path, md_path) in enumerate(zip(pdf_paths, md_targets)):
+        outcome = outcomes[i]
+        record = {
+            "file": str(pdf_path),
+            "md_path": None,
+            "ok": False,
+            "error": None,
+            "cached": i in cache_hits,
+            "page_count": None,
+            "page_chars": None,
+            "text_chars": None,
+        }
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+            # cleans and output md to md file (streamed conversions are already on disk)
+            if outcome is not None:
+                if outcome.get("markdown") is not None:
+                    md_path.write_text(outcome["markdown"], encoding="utf-8")
+                logger.info("Saved: %s", md_path)
+                page_chars = outcome.get("page_chars")
+                record["page_count"] = outcome.get("page_count")
+                record["page_chars"] = page_chars
+                record["text_chars"] = sum(page_chars) if page_chars is not None else None
 
-            md_paths.append(md_path)
-            md_to_pdf[md_path.name] = pdf_path.name
+            record["md_path"] = md_path
+            record["ok"] = True
         except Exception as e:
             logger.warning("Failed conversion: %s | %s", pdf_path, e)
-            errors.append({"file": str(pdf_path), "error": str(e)})
+            record["error"] = str(e)
+        records.append(record)
+
+    logger.info("Converted %d PDFs in %.2fs", len(todo), time.time() - t0)
+    return records
+
+
+def pdfs_to_markdown(
+    pdf_paths: List[Path],
+    output_dir: Path,
+    *,
+    min_md_chars: int = 50,
+    overwrite: bool = True,
+    workers: int = 1,
+    use_cache: bool = True,
+    stream_window_pages: Optional[int] = None,
+) -> Tuple[List[Path], List[Dict], bool, Dict[str, str]]:
+    """
+    Converts PDFs to Markdown using Docling, with cleaning and error handling.
+    Returns: (md_paths, errors, ok, md_to_pdf) — see convert_pdfs for the per-file records.
+    """
+    records = convert_pdfs(
+        pdf_paths,
+        output_dir,
+        min_md_chars=min_md_chars,
+        overwrite=overwrite,
+        workers=workers,
+        use_cache=use_cache,
+        stream_window_pages=stream_window_pages,
+    )
+
+    md_paths: List[Path] = []
+    errors: List[Dict] = []
+    md_to_pdf: Dict[str, str] = {}
+    for rec in records:
+        if rec["ok"]:
+            md_paths.append(rec["md_path"])
+            md_to_pdf[rec["md_path"].name] = Path(rec["file"]).name
+        else:
+            errors.append({"file": rec["file"], "error": rec["error"]})
 
     ok = len(md_paths) > 0
     return md_paths, errors, ok,md_to_pdf
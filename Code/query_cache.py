@@ -0,0 +1,142 @@
+# Code/query_cache.py
+# Two-level query cache:
+#   1. query text -> query embedding          (skips the Ollama embedding call)
+#   2. (dataset_id, mode, index version, normalized query) -> reranked chunks  (skips search + cross-encoder)
+# dataset_id is derived from the content hashes of the dataset's documents, so an edited
+# dataset gets a new id automatically; entries of documents removed from the index are
+# also dropped eagerly (invalidate_docs).
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace/trailing-punctuation-insensitive form used in cache keys."""
+    return _TRAILING_PUNCT.sub("", " ".join(text.lower().split()))
+
+
+def dataset_id(doc_hashes: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(doc_hashes)).encode("utf-8")).hexdigest()[:16]
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a size bound and per-entry time-to-live."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            stale = [k for k in self._data if predicate(k)]
+            for k in stale:
+                del self._data[k]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+QUERY_EMBED_CACHE = TTLCache(maxsize=4096, ttl_seconds=3600)
+RESULT_CACHE = TTLCache(maxsize=1024, ttl_seconds=900)
+# dataset_id -> its doc_hashes, so removing a document can drop every dataset that contained it
+_DATASETS: Dict[str, frozenset] = {}
+_DATASETS_LOCK = threading.Lock()
+
+
+def invalidate_docs(doc_hashes: Iterable[str]) -> int:
+    """Drops cached results of every dataset containing one of doc_hashes."""
+    gone = set(doc_hashes)
+    if not gone:
+        return 0
+    with _DATASETS_LOCK:
+        stale = {d for d, hashes in _DATASETS.items() if hashes & gone}
+    return RESULT_CACHE.invalidate(lambda key: key[0] in stale)
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    return {"embeddings": QUERY_EMBED_CACHE.stats(), "results": RESULT_CACHE.stats()}
+
+
+class CachedRetriever(BaseRetriever):
+    """Serves repeated questions on the same dataset from RESULT_CACHE, else runs the inner retriever."""
+
+    inner: Any
+    dataset_id: str
+    mode: str = "fixed"
+    # index version the inner retriever searches: a rebuilt index never sees older answers
+    version: str = ""
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        key = (self.dataset_id, self.mode, self.version, normalize_query(query))
+        cached = RESULT_CACHE.get(key)
+        if cached is None:
+            docs = self.inner.invoke(query)
+            cached = [(d.id, d.page_content, dict(d.metadata)) for d in docs]
+            RESULT_CACHE.put(key, cached)
+        # fresh Documents each time: callers may mutate metadata
+        return [Document(page_content=text, metadata=dict(meta), id=chunk_id) for chunk_id, text, meta in cached]
+
+
+def cache_retriever(retriever: Any, doc_hashes: Iterable[str], mode: str = "fixed", version: str = "") -> CachedRetriever:
+    hashes = frozenset(doc_hashes)
+    ds = dataset_id(hashes)
+    with _DATASETS_LOCK:
+        _DATASETS[ds] = hashes
+    return CachedRetriever(inner=retriever, dataset_id=ds, mode=mode, version=version)
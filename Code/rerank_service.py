@@ -0,0 +1,139 @@
+# Code/rerank_service.py
+# Cross-request micro-batching for the cross-encoder: (query, passage) pairs from concurrent
+# retrievals are queued, grouped for up to max_wait_ms (or until max_batch_size pairs),
+# and scored in one model call. Exposes latency percentiles and a batch-size histogram.
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_community.cross_encoders import BaseCrossEncoder
+
+
+class _Request:
+    __slots__ = ("pairs", "done", "scores", "error", "submitted")
+
+    def __init__(self, pairs: List[Tuple[str, str]]) -> None:
+        self.pairs = pairs
+        self.done = threading.Event()
+        self.scores: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+        self.submitted = time.perf_counter()
+
+
+def _bucket(n: int) -> str:
+    """Histogram bucket label: smallest power of two >= n."""
+    size = 1
+    while size < n:
+        size *= 2
+    return f"<={size}"
+
+
+class RerankBatcher(BaseCrossEncoder):
+    """
+    Drop-in BaseCrossEncoder whose score() calls are merged across threads into micro-batches.
+
+    Args:
+        model_getter: Returns the real cross-encoder (called on the worker thread, so the
+            model can load lazily).
+        max_batch_size: Max pairs per model call; a single larger request runs on its own.
+        max_wait_ms: How long the first queued request waits for others to join its batch.
+    """
+
+    def __init__(self, model_getter: Callable[[], BaseCrossEncoder], max_batch_size: int = 64, max_wait_ms: float = 5.0) -> None:
+        self.model_getter = model_getter
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        # request that didn't fit the previous batch; it leads the next one
+        self._carry: Optional[_Request] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies_ms: deque = deque(maxlen=4096)
+        self._batch_pairs: Counter = Counter()
+        self._batch_requests: Counter = Counter()
+        self._requests = 0
+        self._batches = 0
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> List[float]:
+        if not text_pairs:
+            return []
+        self._ensure_worker()
+        req = _Request(list(text_pairs))
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.scores
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name="rerank-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[_Request]:
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [self._queue.get()]
+        n_pairs = len(batch[0].pairs)
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while n_pairs < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if n_pairs + len(nxt.pairs) > self.max_batch_size:
+                # doesn't fit: run it first in the next batch
+                self._carry = nxt
+                break
+            batch.append(nxt)
+            n_pairs += len(nxt.pairs)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            pairs = [p for req in batch for p in req.pairs]
+            try:
+                scores = list(self.model_getter().score(pairs))
+                offset = 0
+                for req in batch:
+                    req.scores = scores[offset:offset + len(req.pairs)]
+                    offset += len(req.pairs)
+            except BaseException as e:
+                for req in batch:
+                    req.error = e
+
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._batch_pairs[_bucket(len(pairs))] += 1
+                self._batch_requests[len(batch)] += 1
+                self._latencies_ms.extend((finished - req.submitted) * 1000.0 for req in batch)
+            for req in batch:
+                req.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request latency percentiles (recent window) and batch-size histograms."""
+        with self._stats_lock:
+            lat = sorted(self._latencies_ms)
+            pct = lambda p: round(lat[min(len(lat) - 1, int(p / 100.0 * len(lat)))], 2) if lat else None
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+                "pairs_per_batch": dict(sorted(self._batch_pairs.items(), key=lambda kv: int(kv[0][2:]))),
+                "requests_per_batch": dict(sorted(self._batch_requests.items())),
+            }
@@ -0,0 +1,127 @@
+# Code/section_router.py
+# Header-path section router: every chunk carries section_id (doc_id + h1..h4 path).
+# SectionRouter scores the sections of a dataset against the question with a cheap
+# lexical (idf-weighted) match on header words and document name, and returns a
+# metadata filter that restricts dense search to the matching sections. No match =>
+# no filter (search the whole dataset).
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+HEADER_KEYS = ("h1", "h2", "h3", "h4")
+_WORD = re.compile(r"[a-z]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its may must "
+    "of on or our policy should that the their there this to we what when where which who "
+    "why will with within you your".split()
+)
+
+
+def section_key(metadata: Dict[str, Any]) -> str:
+    """Stable id of the chunk's section: doc_id + header path."""
+    path = " > ".join(str(metadata.get(h, "")) for h in HEADER_KEYS)
+    return hashlib.sha256(f"{metadata.get('doc_id', '')}|{path}".encode("utf-8")).hexdigest()[:12]
+
+
+def _stem(word: str) -> str:
+    # crude suffix stripping is enough to match "refunds"/"refund", "processed"/"processing"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def terms(text: str) -> Set[str]:
+    return {_stem(w) for w in _WORD.findall(text.lower().replace("_", " ")) if w not in _STOPWORDS}
+
+
+class SectionRouter:
+    """Lexical section index over chunk metadatas (one entry per section_id)."""
+
+    def __init__(
+        self,
+        metadatas: Iterable[Dict[str, Any]],
+        min_chunks: int = 10,
+        keep_ratio: float = 0.5,
+        doc_weight: float = 0.5,
+    ) -> None:
+        self.min_chunks = min_chunks
+        self.keep_ratio = keep_ratio
+        self.doc_weight = doc_weight
+        self.chunks: Counter = Counter()
+        self.header_terms: Dict[str, Set[str]] = {}
+        self.doc_terms: Dict[str, Set[str]] = {}
+        # chunks indexed before section ids existed; a section filter would never match them
+        self.uncovered = 0
+        for m in metadatas:
+            sid = m.get("section_id")
+            if not sid:
+                self.uncovered += 1
+                continue
+            self.chunks[sid] += 1
+            if sid not in self.header_terms:
+                self.header_terms[sid] = terms(" ".join(str(m.get(h, "")) for h in HEADER_KEYS))
+                self.doc_terms[sid] = terms(str(m.get("doc_id", "")))
+        df: Counter = Counter()
+        for sid in self.header_terms:
+            df.update(self.header_terms[sid] | self.doc_terms[sid])
+        n = max(len(self.header_terms), 1)
+        self.idf = {t: math.log(1 + n / c) for t, c in df.items()}
+
+    def __len__(self) -> int:
+        return len(self.header_terms)
+
+    def route(self, query: str) -> Optional[List[str]]:
+        """section_ids to search for query, best first (None = don't restrict)."""
+        q = terms(query)
+        # routing would silently drop chunks without a section_id: only route full coverage
+        if not q or len(self.header_terms) < 2 or self.uncovered:
+            return None
+        scores = defaultdict(float)
+        for sid, header in self.header_terms.items():
+            s = sum(self.idf[t] for t in q & header) + self.doc_weight * sum(self.idf[t] for t in q & self.doc_terms[sid])
+            if s > 0:
+                scores[sid] = s
+        if not scores:
+            return None
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best = scores[ranked[0]]
+        picked, covered = [], 0
+        for sid in ranked:
+            # strong matches always; weaker ones only until there are enough candidates
+            if scores[sid] < self.keep_ratio * best and covered >= self.min_chunks:
+                break
+            picked.append(sid)
+            covered += self.chunks[sid]
+        if covered < self.min_chunks:
+            # too little evidence behind the matches: routing would starve the reranker
+            return None
+        return picked
+
+    def filter_for(self, query: str, base_filter: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """base_filter narrowed to the routed sections (base_filter unchanged when not routed)."""
+        sections = self.route(query)
+        if sections is None:
+            return base_filter
+        routed = {"section_id": {"$in": sections}}
+        return {"$and": [base_filter, routed]} if base_filter else routed
+
+
+class RoutedVectorRetriever(BaseRetriever):
+    """Dense similarity search (k results) restricted per query to the sections the router picks."""
+
+    vectorstore: Any
+    router: Any
+    k: int = 20
+    base_filter: Optional[Dict[str, Any]] = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.vectorstore.similarity_search(query, k=self.k, filter=self.router.filter_for(query, self.base_filter))
@@ -0,0 +1,81 @@
+# Code/store_pool.py
+# Reference-counted pool of open resources (vector store clients, retrievers):
+# every caller asking for the same key shares one instance, and the instance is
+# closed when the last holder releases it.
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class RefCountedPool:
+    """Thread-safe acquire/release pool; factory runs once per key while the key is held."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._by_value: Dict[int, Hashable] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    def acquire(self, key: Hashable, factory: Callable[[], Any], closer: Optional[Callable[[Any], None]] = None) -> Any:
+        """Returns the shared instance for key (creating it if needed) and takes one reference."""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # per-key lock: slow factories for different keys don't block each other
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["refs"] += 1
+                    return entry["value"]
+            value = factory()
+            with self._lock:
+                self._entries[key] = {"value": value, "refs": 1, "closer": closer, "opened_at": time.time()}
+                self._by_value[id(value)] = key
+                self.opened += 1
+            return value
+
+    def release(self, key: Hashable) -> bool:
+        """Drops one reference; closes the instance and returns True when it was the last one."""
+        with self._lock:
+            key_lock = self._key_locks.get(key)
+        if key_lock is None:
+            return False
+        # the closer runs under the key lock: a concurrent acquire of the same key waits for it
+        # and opens a fresh instance instead of reusing resources being torn down
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    return False
+                entry["refs"] -= 1
+                if entry["refs"] > 0:
+                    return False
+                del self._entries[key]
+                self._by_value.pop(id(entry["value"]), None)
+                self.closed += 1
+            if entry["closer"] is not None:
+                entry["closer"](entry["value"])
+        return True
+
+    def release_value(self, value: Any) -> bool:
+        """release() by instance (for holders that only kept the object)."""
+        with self._lock:
+            key = self._by_value.get(id(value))
+        return self.release(key) if key is not None else False
+
+    def refs(self, key: Hashable) -> int:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry["refs"] if entry else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._entries),
+                "opened": self.opened,
+                "closed": self.closed,
+                "entries": {str(k): {"refs": e["refs"], "opened_at": e["opened_at"]} for k, e in self._entries.items()},
+            }
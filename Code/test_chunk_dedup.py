@@ -0,0 +1,65 @@
+# test_chunk_dedup.py
+# regression checks for chunk_dedup.dedup_chunks
+# Run: python -m pytest Code/test_chunk_dedup.py   (or python -m Code.test_chunk_dedup)
+from langchain_core.documents import Document
+
+from Code.chunk_dedup import dedup_chunks
+
+BOILERPLATE = (
+    "Items must be returned in their original packaging with all accessories, manuals and proof of "
+    "purchase. Refunds are issued to the original payment method once the item has been inspected "
+    "by our returns team. Shipping costs are non-refundable unless the item arrived damaged or was "
+    "sent in error. The return window for this category is {} calendar days from the delivery date."
+)
+
+
+def _chunk(text: str, h2: str, start: int) -> Document:
+    return Document(
+        page_content=text,
+        metadata={"doc_id": "refund", "doc_hash": "h", "h2": h2, "section_id": h2.lower(), "start_index": start},
+    )
+
+
+def test_sections_differing_in_a_number_are_kept():
+    chunks = [
+        _chunk(BOILERPLATE.format("thirty (30)"), "Standard items", 0),
+        _chunk(BOILERPLATE.format("fourteen (14)"), "Electronics", 1),
+    ]
+    kept, report = dedup_chunks(chunks)
+    assert report["near_dups"] == 0
+    assert len(kept) == 2
+
+
+def test_same_section_number_change_is_kept():
+    chunks = [
+        _chunk(BOILERPLATE.format("thirty (30)"), "Standard items", 0),
+        _chunk(BOILERPLATE.format("fourteen (14)"), "Standard items", 1),
+    ]
+    kept, report = dedup_chunks(chunks)
+    assert report["near_dups"] == 0
+    assert len(kept) == 2
+
+
+def test_near_duplicate_in_same_section_is_merged():
+    text = BOILERPLATE.format("thirty (30)")
+    chunks = [
+        _chunk(text, "Standard items", 0),
+        _chunk(text.replace("manuals and", "manuals, and"), "Standard items", 1),
+    ]
+    kept, report = dedup_chunks(chunks)
+    assert report["near_dups"] == 1
+    assert kept[0].metadata["merged_from"] == "refund@1"
+
+
+def test_exact_duplicates_across_sections_are_dropped():
+    text = BOILERPLATE.format("thirty (30)")
+    kept, report = dedup_chunks([_chunk(text, "Standard items", 0), _chunk(text, "Electronics", 1)])
+    assert report["exact_dups"] == 1
+    assert len(kept) == 1
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"ok  {name}")
@@ -1,7 +1,7 @@
 # test_mcp.py
 # testing purpose of mcp server 
 # 
-from Code.mcp_server import create_session, ask
+from Code.mcp_server import create_session, ask, wait_for_session
 
 with open(r"/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/csv/customers.csv", "rb") as f:
     customers_bytes = f.read()
@@ -17,6 +17,7 @@ session = create_session(
 
 sid = session["session_id"] if isinstance(session, dict) else session
 print("Session ID:", sid)
+print("Status:", wait_for_session(sid))
 
 result = ask(
     session_id=sid,
@@ -0,0 +1,59 @@
+# Code/text_normalize.py
+# Precompiled text normalization shared by the PDF cleaner (pdf_to_markdown.clean_markdown),
+# the embedding sanitizer (vectorize.sanitize_text) and the header fixer (vectorize.split_by_md).
+# Output is identical to the original step-by-step regexes; see Code/bench_normalize.py.
+import re
+
+# --- clean_markdown ---------------------------------------------------------
+_MULTI_BLANK = re.compile(r"[ \t]{2,}")
+# lookahead instead of a capture: same matches (punctuation is never whitespace), no template
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+(?=[,.;:!?])")
+_PUNCT_THEN_LETTER = re.compile(r"[:.!?](?=[a-zA-Z])")
+_TRAILING_BLANK = re.compile(r"[ \t]+\n")
+_EXTRA_NEWLINES = re.compile(r"\n{3,}")
+
+# --- sanitize_text ----------------------------------------------------------
+# The four sanitize rewrites only ever insert a space between two non-space characters,
+# and each insertion point is owned by its left-hand character, so one alternation keyed
+# on that character does all of them in a single scan. The whitespace collapse is
+# then str.split/join (same Unicode whitespace set as \s, but in C without the regex engine).
+_SANITIZE_INSERT = re.compile(
+    r"[:.!?=*](?=[a-zA-Z])"     # 'end.Next' -> 'end. Next', '=Price' -> '= Price'
+    r"|[a-z](?=[A-Z=*])"        # 'Customerchurn' -> 'Customer churn', 'Revenue=' -> 'Revenue ='
+    r"|[A-Z](?=[=*])"           # 'ID=' -> 'ID ='
+)
+
+# --- split_by_md header fixes -----------------------------------------------
+_INDENTED_HEADER = re.compile(r"^[ \t]+#", flags=re.MULTILINE)
+_HEADER_RUN = re.compile(r"(##+)")
+_HEADER_NO_SPACE = re.compile(r"^(#+)([^#\s])", flags=re.MULTILINE)
+
+
+def clean_markdown(md_text: str) -> str:
+    """Cleans Docling Markdown (escapes, symbols, spacing); see pdf_to_markdown.clean_markdown."""
+    text = md_text
+    if "\\_" in text:
+        text = text.replace(r"\_", "_")
+    if "×" in text:
+        text = text.replace("×", "*")
+    text = _MULTI_BLANK.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCT.sub("", text)
+    text = _PUNCT_THEN_LETTER.sub(r"\g<0> ", text)
+    text = _TRAILING_BLANK.sub("\n", text)
+    if "\n\n\n" in text:
+        text = _EXTRA_NEWLINES.sub("\n\n", text)
+    return text.strip()
+
+
+def sanitize_text(text: str) -> str:
+    """Single-scan version of vectorize.sanitize_text (spacing fixes + whitespace collapse)."""
+    return " ".join(_SANITIZE_INSERT.sub(r"\g<0> ", text).split())
+
+
+def fix_md_headers(text: str) -> str:
+    """Makes headers visible to MarkdownHeaderTextSplitter (un-indent, own line, space after #)."""
+    if "#" not in text:
+        return text
+    text = _INDENTED_HEADER.sub("#", text)
+    text = _HEADER_RUN.sub(r"\n\1", text)
+    return _HEADER_NO_SPACE.sub(r"\1 \2", text)
@@ -11,48 +11,376 @@ Key components and why they are used:
 """
 
 import hashlib
+import json
+import os
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_text_splitters import MarkdownHeaderTextSplitter,RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaEmbeddings
 import shutil
-import re
+from . import text_normalize
+from .hashing import file_sha256
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .embedding_executor import EmbeddingExecutor
+from .model_registry import MODEL_REGISTRY
+from .rerank_service import RerankBatcher
+from .adaptive_retrieval import AdaptiveRerankRetriever
+from .exact_index import ExactIndex, ExactVectorStore
+from .query_cache import QUERY_EMBED_CACHE, cache_retriever, dataset_id, invalidate_docs
+from .store_pool import RefCountedPool
+from .chunk_dedup import dedup_chunks
+from .access_log import AccessLog
+from .section_router import RoutedVectorRetriever, SectionRouter, section_key
+from contextlib import contextmanager
 from langchain_classic.retrievers import ContextualCompressionRetriever
 from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 # Directory to store Chroma vector database
 CHROMA_DIR = Path(r"/Users/pardeepwalia/Desktop/Data/TCS-Submission/Data/vector_db")
 COLLECTION = "kb_md"
-print("--- LOADING GLOBAL RERANKER (Please wait...) ---")
-GLOBAL_RERANKER_MODEL = HuggingFaceCrossEncoder(model_name="cross-encoder/ms-marco-MiniLM-L-6-v2")
-print("--- RERANKER LOADED ---")
+# Cross-encoder reranker: loaded lazily through the model registry on the first rerank
+# (or explicitly via warm_reranker) and shared by every session's retriever.
+RERANKER_MODEL = "cross_encoder_reranker"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def _load_reranker() -> HuggingFaceCrossEncoder:
+    print("--- LOADING GLOBAL RERANKER (Please wait...) ---")
+    model = HuggingFaceCrossEncoder(model_name=RERANKER_MODEL_NAME)
+    print("--- RERANKER LOADED ---")
+    return model
+
+
+MODEL_REGISTRY.register(RERANKER_MODEL, _load_reranker)
+
+
+def warm_reranker() -> float:
+    """Loads the shared reranker ahead of the first query; returns load seconds."""
+    return MODEL_REGISTRY.warm(RERANKER_MODEL)
+
+
+# "fixed" = always rerank all 20 candidates; "adaptive" = see adaptive_retrieval.py
+RETRIEVAL_MODE = "fixed"
+
+# One batcher for the whole process: concurrent retrievals share cross-encoder calls.
+# The model getter runs on the batcher thread, so the reranker still loads on first use.
+RERANK_BATCHER = RerankBatcher(lambda: MODEL_REGISTRY.get(RERANKER_MODEL), max_batch_size=64, max_wait_ms=5.0)
+
+EMBED_MODEL = "mxbai-embed-large:latest"
+_EMBEDDINGS: Optional[CachedEmbeddings] = None
+_EMBEDDINGS_LOCK = threading.Lock()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """Ollama embeddings behind the persistent per-chunk embedding cache (one per process)."""
+    global _EMBEDDINGS
+    with _EMBEDDINGS_LOCK:
+        if _EMBEDDINGS is None:
+            _EMBEDDINGS = CachedEmbeddings(
+                OllamaEmbeddings(model=EMBED_MODEL), EMBED_MODEL, EmbeddingCache(), query_cache=QUERY_EMBED_CACHE
+            )
+    return _EMBEDDINGS
+
+
+# Single shared collection; every chunk carries the content hash of its document (doc_hash)
+INDEX_DIR = CHROMA_DIR / "kb"
+MANIFEST_NAME = "index_manifest.json"
+# guards _SLOT_LOCKS / _RETIRED below
+_INDEX_LOCK = threading.Lock()
+
+# Blue/green rebuilds. An index directory ("slot", e.g. INDEX_DIR) may contain versions/<name>/
+# plus a CURRENT file naming the live version; without CURRENT the slot itself is the index.
+# rebuild_index builds a new version while the live one keeps serving, swap_index replaces
+# CURRENT atomically, and a swapped-out version is deleted once no session has it open.
+CURRENT_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+# one writer at a time per slot (collection + manifest); re-entrant for nested helpers
+_SLOT_LOCKS: Dict[str, threading.RLock] = {}
+# swapped-out index dir -> its slot, until its last reader closes it
+_RETIRED: Dict[str, Path] = {}
+# versions a rebuild is writing right now (never garbage)
+_BUILDING: set = set()
+
+
+def _slot_lock(slot: Path) -> threading.RLock:
+    with _INDEX_LOCK:
+        return _SLOT_LOCKS.setdefault(str(Path(slot)), threading.RLock())
+
+
+def live_index_dir(slot: Path) -> Path:
+    """Directory of the version of slot that currently serves queries."""
+    slot = Path(slot)
+    try:
+        name = (slot / CURRENT_NAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return slot
+    return slot / VERSIONS_DIR / name
+
+
+def new_version_dir(slot: Path) -> Path:
+    return Path(slot) / VERSIONS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def swap_index(slot: Path, staged: Path) -> Path:
+    """Makes staged (a dir under slot/versions) the live index; returns the retired one."""
+    slot = Path(slot)
+    with _slot_lock(slot):
+        old = live_index_dir(slot)
+        tmp = slot / f"{CURRENT_NAME}.tmp"
+        tmp.write_text(Path(staged).name, encoding="utf-8")
+        os.replace(tmp, slot / CURRENT_NAME)
+        with _INDEX_LOCK:
+            _RETIRED[str(old)] = slot
+        # answers cached over the old version's chunks are stale (the rebuild re-chunked them)
+        invalidate_docs(set(_load_manifest(old)["chunks"]) | set(_load_manifest(Path(staged))["chunks"]))
+    print(f"--- Swapped index {slot.name}: {old.name} -> {Path(staged).name} ---")
+    if CHROMA_POOL.refs(str(old)) == 0:
+        _delete_retired(old)
+    return old
+
+
+def _delete_retired(index_dir: Path) -> None:
+    with _INDEX_LOCK:
+        slot = _RETIRED.pop(str(index_dir), None)
+    if slot is None:
+        return
+    if Path(index_dir) == slot:
+        # pre-versioning layout: the old index lives next to versions/ and CURRENT
+        for p in slot.iterdir():
+            if p.name in (VERSIONS_DIR, CURRENT_NAME):
+                continue
+            if p.is_dir():
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                p.unlink(missing_ok=True)
+    else:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    print(f"--- Deleted retired index {index_dir} ---")
+# last use of each document (doc_hash) and exact index, for LRU garbage collection (gc_index.py)
+ACCESS_LOG = AccessLog(CHROMA_DIR / "access_log.json")
+
+# Small datasets are served from an in-process exact index (exact_index.py) instead of
+# Chroma/HNSW. "auto" = exact at or below EXACT_MAX_CHUNKS chunks, "chroma"/"exact" force one.
+EXACT_DIR = CHROMA_DIR / "exact"
+EXACT_MAX_CHUNKS = 5000
+VECTOR_BACKEND = "auto"
+# "int8": keep int8 codes in memory (4x smaller) and rescore the shortlist from the float32
+# file on disk; "none" (default): search the float32 matrix directly. int8 trades ~1.4x slower
+# search for the memory, so enable it only where resident memory is the constraint.
+EXACT_QUANTIZATION = "none"
+
+
+def _use_exact(n_chunks: int, vector_backend: Optional[str]) -> bool:
+    backend = vector_backend or VECTOR_BACKEND
+    return backend == "exact" or (backend == "auto" and n_chunks <= EXACT_MAX_CHUNKS)
+
+
+def exact_index_dir(index_dir: Path, doc_hashes: Iterable[str]) -> Path:
+    """
+    Exact index location for a set of documents exported from the index version index_dir
+    (content-addressed: edits => new dir; a rebuild re-chunks, so a new version => new dir too).
+    """
+    parts = [EMBED_MODEL, str(Path(index_dir)), *sorted(doc_hashes)]
+    key = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+    return EXACT_DIR / key
+
+
+def export_exact_index(persist_dir: Path, doc_hashes: List[str]) -> Path:
+    """Copies this dataset's chunks + vectors out of the shared Chroma collection into an exact index."""
+    root = exact_index_dir(persist_dir, doc_hashes)
+    if ExactIndex.exists(root):
+        return root
+    with chroma_collection(persist_dir) as db:
+        got = db._collection.get(
+            where={"doc_hash": {"$in": list(doc_hashes)}},
+            include=["embeddings", "documents", "metadatas"],
+        )
+    ExactIndex.build(root, got["ids"], got["documents"], got["metadatas"], got["embeddings"], model=EMBED_MODEL)
+    print(f"--- Exported {len(got['ids'])} chunks to exact index {root.name} ---")
+    return root
+
+
+def exact_retriever(persist_dir: Path, doc_hashes: List[str], retrieval_mode: Optional[str] = None):
+    """Reranking retriever over the exact index for doc_hashes (exported from Chroma on first use)."""
+    root = export_exact_index(persist_dir, doc_hashes)
+    ACCESS_LOG.touch("exact", [root.name])
+    print(f"--- Opening Exact Index at {root} ---")
+    store = ExactVectorStore(ExactIndex(root, quantization=EXACT_QUANTIZATION), get_embeddings())
+    # the index only holds this dataset's chunks: no doc_hash filter needed
+    return _make_retriever(store, {"k": 20}, retrieval_mode, router=_section_router(store.index.metadatas))
+
+
+# One open Chroma client per index directory and one retriever per dataset, shared by
+# every session; both are reference counted and closed when the last holder releases them.
+CHROMA_POOL = RefCountedPool("chroma")
+RETRIEVER_POOL = RefCountedPool("retrievers")
+# pooled retriever key -> doc_hashes it serves (documents the garbage collector must keep)
+_POOLED_DOCS: Dict[Tuple, frozenset] = {}
+
+
+def _open_chroma(persist_dir: Path) -> Chroma:
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    print(f"--- Opening Vector Store at {persist_dir} ---")
+    return Chroma(
+        persist_directory=str(persist_dir),
+        embedding_function=get_embeddings(),
+        collection_name=COLLECTION,
+        collection_metadata={"hnsw:space": "cosine"}
+    )
+
+
+def _close_chroma(db: Chroma) -> None:
+    client = getattr(db, "_client", None)
+    system = getattr(client, "_system", None)
+    if system is not None:
+        system.stop()
+    # chromadb keeps one System per path; drop it so the SQLite/HNSW handles are freed
+    systems = getattr(type(client), "_identifier_to_system", None)
+    if isinstance(systems, dict):
+        systems.pop(getattr(client, "_identifier", None), None)
+
+
+def _acquire_chroma(persist_dir: Path) -> Chroma:
+    persist_dir = Path(persist_dir)
+
+    def closer(db: Chroma) -> None:
+        _close_chroma(db)
+        # last reader of a swapped-out version: it can go now
+        if str(persist_dir) in _RETIRED:
+            _delete_retired(persist_dir)
+
+    return CHROMA_POOL.acquire(str(persist_dir), lambda: _open_chroma(persist_dir), closer)
+
+
+@contextmanager
+def chroma_collection(persist_dir: Path):
+    """Borrows the pooled Chroma store at persist_dir for the duration of a with-block."""
+    db = _acquire_chroma(persist_dir)
+    try:
+        yield db
+    finally:
+        CHROMA_POOL.release(str(Path(persist_dir)))
+
+
+def acquire_retriever(
+    persist_dir: Path,
+    doc_hashes: Optional[List[str]],
+    retrieval_mode: Optional[str] = None,
+    exact: bool = False,
+    cache_results: bool = True,
+):
+    """
+    Shared reranking retriever for a dataset (one per persist_dir/dataset/mode/backend).
+    Each call takes a reference; hand the retriever back with release_retriever().
+    persist_dir is an index version dir (live_index_dir()), not a slot.
+    """
+    persist_dir = Path(persist_dir)
+    mode = retrieval_mode or RETRIEVAL_MODE
+    key = (str(persist_dir), dataset_id(doc_hashes or []), mode, "exact" if exact else "chroma", cache_results)
+    ACCESS_LOG.touch("docs", doc_hashes or [])
+    if exact:
+        ACCESS_LOG.touch("exact", [exact_index_dir(persist_dir, doc_hashes).name])
+
+    def factory():
+        if exact:
+            retriever = exact_retriever(persist_dir, doc_hashes, mode)
+        else:
+            search_kwargs: Dict = {"k": 20}
+            if doc_hashes:
+                # the collection is shared: only search this dataset's documents
+                search_kwargs["filter"] = {"doc_hash": {"$in": list(doc_hashes)}}
+            db = _acquire_chroma(persist_dir)
+            router = None
+            if SECTION_ROUTING:
+                got = db._collection.get(where=search_kwargs.get("filter"), include=["metadatas"])
+                router = _section_router(got["metadatas"])
+            retriever = _make_retriever(db, search_kwargs, mode, router=router)
+        _POOLED_DOCS[key] = frozenset(doc_hashes or [])
+        return cache_retriever(retriever, doc_hashes or [], mode, version=persist_dir.name) if cache_results else retriever
+
+    def closer(_retriever) -> None:
+        _POOLED_DOCS.pop(key, None)
+        if not exact:
+            CHROMA_POOL.release(str(persist_dir))
+
+    return RETRIEVER_POOL.acquire(key, factory, closer)
+
+
+def release_retriever(retriever) -> bool:
+    """Drops one reference to a pooled retriever; True when its index was closed."""
+    return RETRIEVER_POOL.release_value(retriever) if retriever is not None else False
+
+
+def live_doc_hashes() -> set:
+    """doc_hashes served by a retriever some session currently holds."""
+    return set().union(*_POOLED_DOCS.values()) if _POOLED_DOCS else set()
+
+
+def pool_stats() -> Dict:
+    return {"chroma": CHROMA_POOL.stats(), "retrievers": RETRIEVER_POOL.stats()}
+
+
+# route each question to the sections whose headers match it before dense search (section_router.py)
+SECTION_ROUTING = True
+
+
+def _section_router(metadatas: List[Dict]) -> Optional[SectionRouter]:
+    if not SECTION_ROUTING:
+        return None
+    router = SectionRouter(metadatas)
+    # chunks indexed before section ids existed can't be routed, and a section filter would
+    # exclude them: route only datasets whose chunks all carry a section_id
+    return router if len(router) and not router.uncovered else None
+
+
 # compute a stable hash for dataset
 def compute_dataset_hash(file_paths: list[str]) -> str:
     """
-    Generates a stable hash for a dataset based on:
-    - absolute file path
-    - file size
-    Any change in docs => new hash => new vector DB
+    Generates a stable hash for a dataset from the content hash of each document
+    (order- and filename-independent): any edit to any document => new hash.
     """
     hasher = hashlib.sha256()
 
-    for path in sorted(file_paths):
-        p = Path(path)
-        if not p.exists():
-            continue
-
-        stat = p.stat()
-        # Create a fingerprint using file name and size
-        fingerprint = f"{p.name}|{stat.st_size}"
-        hasher.update(fingerprint.encode("utf-8"))
+    for digest in sorted(file_sha256(p) for p in file_paths if Path(p).exists()):
+        hasher.update(digest.encode("utf-8"))
 
     # Short hash keeps folder names clean
     return hasher.hexdigest()[:16]
 
+
+def _load_manifest(persist_dir: Path) -> Dict:
+    """
+    Manifest of the index at persist_dir:
+    {"docs": {doc_id: doc_hash}, "chunks": {doc_hash: n_chunks}, "datasets": {dataset_id: [doc_hash, ...]}}.
+    A document's chunks stay indexed while any dataset references its doc_hash.
+    """
+    try:
+        manifest = json.loads((persist_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {"docs": {}, "chunks": {}, "datasets": {}}
+    # manifests written before datasets were tracked: keep everything referenced
+    manifest.setdefault("datasets", {"legacy": sorted(manifest["chunks"])})
+    return manifest
+
+
+def _save_manifest(persist_dir: Path, manifest: Dict) -> None:
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    tmp = persist_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, persist_dir / MANIFEST_NAME)
+
+
+def _chunk_ids(doc_hash: str, n_chunks: int) -> List[str]:
+    return [f"{doc_hash}:{n}" for n in range(n_chunks)]
+
+
 # reading MD files
-def build_retriever(md_paths:List[str]):
+def build_retriever(md_paths:List[str], persist_dir: Path = INDEX_DIR, prune_missing: bool = False, force_rebuild: bool = False, retrieval_mode: Optional[str] = None, vector_backend: Optional[str] = None, cache_results: bool = True):
    
    """Builds a retriever for Markdown documents by processing them through multiple stages.
 
@@ -73,32 +401,256 @@ def build_retriever(md_paths:List[str]):
     - Reranking retriever: Uses a cross-encoder to rerank top candidates, reducing duplicates and 
       improving relevance with MMR (top k=5).
 
+    Incremental indexing: all documents live in one collection at persist_dir, keyed by the
+    content hash of each document (doc_hash). Only documents whose content isn't indexed yet
+    are chunked and embedded. Each call registers its dataset (its set of doc_hashes) in the
+    manifest; chunks are deleted only once no registered dataset references their doc_hash
+    (prune_missing replaces all datasets with this one; gc_index drops idle ones).
+    The returned retriever only searches this call's documents.
+
     Args:
         md_paths: A list of local filesystem paths to .md files.
+        persist_dir: The shared index directory (default INDEX_DIR).
+        prune_missing: md_paths is the complete library: drop every other dataset and
+            delete documents that aren't in md_paths.
+        force_rebuild: Re-embed md_paths from scratch into a new index version and swap it
+            in when done (rebuild_index); the current version serves queries meanwhile and
+            its other datasets are carried over (all of them unless prune_missing).
+        retrieval_mode: "fixed" or "adaptive" (see embed_vectorize).
+        vector_backend: "auto" (exact index for datasets up to EXACT_MAX_CHUNKS chunks),
+            "chroma" or "exact". Default VECTOR_BACKEND.
+        cache_results: Serve repeated questions on this dataset from the result cache
+            (query_cache.RESULT_CACHE; keyed by the documents' content hashes).
 
     Returns:
-        A ContextualCompressionRetriever for efficient, high-quality document retrieval.
+        A pooled reranking retriever shared with every other caller of the same dataset;
+        hand it back with release_retriever() when the session ends.
         
     Note:
         Empty files are skipped to avoid 'empty vector' errors. The pipeline follows a similar 
         ingestion approach as for PDF documents but adapted for Markdown's structured format.
     """
   
-    # Documents ready to be vectorized
-   docs: List[Document] = []
-   dataset_id = compute_dataset_hash(md_paths)
-  # persist dir per dataset (subfolder)
-   persist_dir = CHROMA_DIR / dataset_id
-    # NEW: If directory exists and has files, skip reading/splitting/sanitizing
-   if persist_dir.exists() and any(persist_dir.iterdir()):
-        print(f"--- Fast Loading Existing Vector Index: {dataset_id} ---")
-        return embed_vectorize([], persist_dir=persist_dir)
-
-   # Otherwise, proceed with full ingestion
-   persist_dir.mkdir(parents=True, exist_ok=True)
-   # iterating over md file paths and reading text  
-   for p in sorted(md_paths):
+   slot = Path(persist_dir)
+   if force_rebuild:
+       return rebuild_index(md_paths, slot, prune_missing=prune_missing, retrieval_mode=retrieval_mode, vector_backend=vector_backend, cache_results=cache_results)
+
+   n_chunks = index_documents(md_paths, slot, prune_missing=prune_missing)
+   doc_hashes = sorted(n_chunks)
+   exact = _use_exact(sum(n_chunks.values()), vector_backend)
+   return _acquire_live(slot, doc_hashes, retrieval_mode, exact=exact, cache_results=cache_results)
+
+
+def index_documents(md_paths: List[str], persist_dir: Path = INDEX_DIR, prune_missing: bool = False) -> Dict[str, int]:
+    """
+    The indexing half of build_retriever: brings the index at persist_dir (a slot) up to date
+    with md_paths and registers them as a dataset. Returns {doc_hash: n_chunks} of md_paths.
+    """
+    slot = Path(persist_dir)
+    # content fingerprint per document: md path -> sha256
+    fingerprints = {str(p): file_sha256(p) for p in md_paths}
+    # only content that isn't indexed yet gets read/split/embedded (once per distinct hash)
+    first_path = {}
+    for p, h in fingerprints.items():
+        first_path.setdefault(h, p)
+
+    # chunks + vectors prepared outside the slot lock, keyed by doc_hash
+    prepared: Dict[str, Tuple[List[Document], List[List[float]]]] = {}
+    while True:
+        with _slot_lock(slot):
+            # the version of the index that serves queries right now
+            persist_dir = live_index_dir(slot)
+            manifest = _load_manifest(persist_dir)
+            missing = [h for h in first_path if h not in manifest["chunks"]]
+            unprepared = [h for h in missing if h not in prepared]
+            if not unprepared:
+                return _commit_dataset(persist_dir, manifest, fingerprints, prepared, missing, prune_missing)
+        # the slow part runs unlocked: other sessions keep indexing and loading meanwhile.
+        # Whatever they commit in between is picked up by the re-check above.
+        prepared.update(_prepare_documents([first_path[h] for h in unprepared], fingerprints))
+
+
+def _prepare_documents(md_paths: List[str], fingerprints: Dict[str, str]) -> Dict[str, Tuple[List[Document], List[List[float]]]]:
+    """Reads, splits, dedups and embeds md_paths; returns {doc_hash: (chunks, vectors)}."""
+    print(f"--- Embedding {len(md_paths)} new docs ---")
+    # iterating over md file paths and reading text
+    docs = load_md_documents(md_paths, fingerprints)
+
+    # splitting the document to chunks based on headers
+    split_docs=split_by_md(docs)
+
+    #recusrive splitting for hugh chunk of MD chunks
+    recur_split= cap_chunk_size(split_docs)
+
+    # drop repeated boilerplate (exact / near-duplicate chunks) before embedding
+    recur_split, dedup_report = dedup_chunks(recur_split)
+    print(f"--- Dedup: kept {dedup_report['kept']}/{dedup_report['input']} chunks "
+          f"({dedup_report['exact_dups']} exact, {dedup_report['near_dups']} near duplicates) ---")
+
+    vectors = EmbeddingExecutor(get_embeddings()).embed([c.page_content for c in recur_split])
+    # empty documents are recorded too (0 chunks), so they aren't re-read on every call
+    prepared: Dict[str, Tuple[List[Document], List[List[float]]]] = {fingerprints[p]: ([], []) for p in md_paths}
+    for c, v in zip(recur_split, vectors):
+        prepared[c.metadata["doc_hash"]][0].append(c)
+        prepared[c.metadata["doc_hash"]][1].append(v)
+    return prepared
+
+
+def _commit_dataset(
+    persist_dir: Path,
+    manifest: Dict,
+    fingerprints: Dict[str, str],
+    prepared: Dict[str, Tuple[List[Document], List[List[float]]]],
+    missing: List[str],
+    prune_missing: bool,
+) -> Dict[str, int]:
+    """
+    Under the slot lock: registers the dataset, upserts the prepared chunks of the missing
+    doc_hashes, deletes content no dataset references and saves the manifest.
+    Returns {doc_hash: n_chunks} for the dataset.
+    """
+    doc_hashes = sorted(set(fingerprints.values()))
+    # which doc_ids point at which content now
+    current = {Path(p).stem: h for p, h in fingerprints.items()}
+    ds = dataset_id(doc_hashes)
+    registered = manifest["datasets"].get(ds) == doc_hashes
+    if prune_missing:
+        # md_paths is the complete library: every other dataset and document goes
+        docs_after = dict(current)
+        datasets_after = {ds: doc_hashes}
+    else:
+        docs_after = {**manifest["docs"], **current}
+        datasets_after = {**manifest["datasets"], ds: doc_hashes}
+
+    # content no dataset references any more gets deleted. Another session uploading the
+    # same doc_id with different bytes registers its own dataset and leaves this one's alone.
+    still_used = {h for hashes in datasets_after.values() for h in hashes}
+    delete_hashes = [h for h in manifest["chunks"] if h not in still_used]
+    delete_ids = [i for h in delete_hashes for i in _chunk_ids(h, manifest["chunks"][h])]
+
+    n_chunks = {h: len(prepared[h][0]) if h in missing else manifest["chunks"][h] for h in doc_hashes}
+    if not missing and not delete_ids and registered and manifest["datasets"] == datasets_after:
+        print(f"--- Fast Loading Existing Vector Index: {len(doc_hashes)} docs up to date ---")
+        return n_chunks
+
+    print(f"--- Updating Vector Index: +{len(missing)} docs, -{len(delete_hashes)} stale ---")
+    # stable ids per document: <doc_hash>:<n>
+    chunks = [c for h in missing for c in prepared[h][0]]
+    vectors = [v for h in missing for v in prepared[h][1]]
+    ids = [i for h in missing for i in _chunk_ids(h, len(prepared[h][0]))]
+
+    #embed and vectorized chunks
+    index_chunks(chunks, persist_dir=persist_dir, ids=ids, delete_ids=delete_ids, vectors=vectors)
+
+    for h in delete_hashes:
+        manifest["chunks"].pop(h, None)
+    manifest["chunks"].update({h: len(prepared[h][0]) for h in missing})
+    manifest["docs"] = docs_after
+    manifest["datasets"] = datasets_after
+    _save_manifest(persist_dir, manifest)
+
+    # cached answers over removed/edited documents are stale now
+    invalidate_docs(delete_hashes)
+    return n_chunks
+
+
+def _acquire_live(slot: Path, doc_hashes: Optional[List[str]], retrieval_mode: Optional[str], exact: bool = False, cache_results: bool = True):
+    """acquire_retriever on the live version of slot; retried if a swap lands while opening it."""
+    while True:
+        index_dir = live_index_dir(slot)
+        retriever = acquire_retriever(index_dir, doc_hashes, retrieval_mode, exact=exact, cache_results=cache_results)
+        if live_index_dir(slot) == index_dir:
+            return retriever
+        release_retriever(retriever)
+
+
+def rebuild_index(
+    md_paths: List[str],
+    persist_dir: Path = INDEX_DIR,
+    prune_missing: bool = False,
+    retrieval_mode: Optional[str] = None,
+    vector_backend: Optional[str] = None,
+    cache_results: bool = True,
+):
+    """
+    Blue/green rebuild of the index at persist_dir: md_paths are re-chunked and re-embedded.
+
+    The new version is built under persist_dir/versions/ while the current one keeps serving
+    queries. Just before CURRENT is swapped (under the slot lock), every dataset of the live
+    version that the rebuild doesn't cover is carried over with its stored vectors, including
+    datasets indexed while the rebuild ran; with prune_missing only those registered during
+    the rebuild survive. The old version is deleted as soon as the last session holding it
+    releases its retriever. Returns a retriever on the new version.
+    """
+    slot = Path(persist_dir)
+    with _slot_lock(slot):
+        before = _load_manifest(live_index_dir(slot))["datasets"]
+    staged = new_version_dir(slot)
+    print(f"--- Rebuilding Vector Index into {staged} (live: {live_index_dir(slot)}) ---")
+    _BUILDING.add(str(staged))
+    retriever = None
+    try:
+        retriever = build_retriever(
+            md_paths, staged, prune_missing=True,
+            retrieval_mode=retrieval_mode, vector_backend=vector_backend, cache_results=cache_results,
+        )
+        with _slot_lock(slot):
+            dropped = before if prune_missing else {}
+            _carry_over(live_index_dir(slot), staged, dropped)
+            swap_index(slot, staged)
+    except Exception:
+        release_retriever(retriever)
+        shutil.rmtree(staged, ignore_errors=True)
+        raise
+    finally:
+        _BUILDING.discard(str(staged))
+    return retriever
+
+
+def _carry_over(live_dir: Path, staged: Path, dropped: Dict[str, List[str]]) -> None:
+    """
+    Copies the live version's datasets (except those in dropped) into staged: chunks are
+    copied with their vectors, nothing is re-embedded. Caller holds the slot lock.
+    """
+    live = _load_manifest(live_dir)
+    target = _load_manifest(staged)
+    carried = {
+        ds: hashes for ds, hashes in live["datasets"].items()
+        if ds not in target["datasets"] and dropped.get(ds) != hashes
+    }
+    counts = {
+        h: live["chunks"][h] for hashes in carried.values() for h in hashes
+        if h in live["chunks"] and h not in target["chunks"]
+    }
+    if not carried:
+        return
+    print(f"--- Carrying over {len(carried)} datasets ({len(counts)} docs) from {live_dir.name} ---")
+    ids = [i for h, n in counts.items() for i in _chunk_ids(h, n)]
+    with chroma_collection(live_dir) as src, chroma_collection(staged) as dst:
+        for start in range(0, len(ids), 512):
+            got = src._collection.get(ids=ids[start:start + 512], include=["embeddings", "documents", "metadatas"])
+            if got["ids"]:
+                dst._collection.upsert(
+                    ids=got["ids"], embeddings=got["embeddings"], documents=got["documents"], metadatas=got["metadatas"]
+                )
+    target["chunks"].update(counts)
+    target["datasets"].update(carried)
+    still_used = {h for hashes in target["datasets"].values() for h in hashes}
+    for doc_id, h in live["docs"].items():
+        if h in still_used:
+            target["docs"].setdefault(doc_id, h)
+    _save_manifest(staged, target)
+
+
+def load_md_documents(md_paths: List[str], fingerprints: Optional[Dict[str, str]] = None) -> List[Document]:
+    """
+    Reads and sanitizes .md files into Documents (empty files are skipped).
+    Each Document carries doc_hash (content sha256; taken from fingerprints when given).
+    """
+    docs: List[Document] = []
+    for p in sorted(md_paths):
         path=Path(p)
+        doc_hash = (fingerprints or {}).get(str(p)) or file_sha256(path)
         text = path.read_text(encoding="utf-8", errors="ignore").strip()
         clean_text = sanitize_text(text)
         if not clean_text:
@@ -107,21 +659,11 @@ def build_retriever(md_paths:List[str]):
             page_content=clean_text, 
             metadata={"source": str(p), 
             "filename":Path(p).name,
-            "doc_id": Path(p).stem
+            "doc_id": Path(p).stem,
+            "doc_hash": doc_hash,
             }
         ))
-
-
-   # splitting the document to chunks based on headers
-   split_docs=split_by_md(docs)
-   
-   #recusrive splitting for hugh chunk of MD chunks
-   recur_split= cap_chunk_size(split_docs)
-   
-   #embed and vectorized chunks
-   retriever= embed_vectorize(recur_split,persist_dir=persist_dir)    
-   
-   return retriever
+    return docs
 
 
 # duouble text sanitizing for bettter chunking
@@ -145,19 +687,9 @@ def sanitize_text(text: str) -> str:
     Returns:
         str: The sanitized text with improved spacing for better embedding quality.
     """
-    # 1. Insert space after punctuation if followed by a letter (Fixes 'inputs.##')
-    text = re.sub(r'([:.!?])([a-zA-Z])', r'\1 \2', text)
-    
-    # 2. Add space between lowercase and uppercase (Fixes 'Customerchurn')
-    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-    
-    # 3. Fix math/symbol collapse (Fixes 'Revenue=Price')
-    text = re.sub(r'([a-zA-Z])([=*])', r'\1 \2', text)
-    text = re.sub(r'([=*])([a-zA-Z])', r'\1 \2', text)
-    
-    # 4. Collapse extra whitespace back to single spaces
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    # 1. space after punctuation before a letter  2. lowercase|Uppercase
+    # 3. letter|'=*' and '=*'|letter  4. collapse whitespace — all in one scan (text_normalize)
+    return text_normalize.sanitize_text(text)
 
 
 
@@ -187,14 +719,8 @@ def split_by_md (docs:List[Document])-> List[Document]:
     out: List[Document]= []
 
     for d in docs:
-       # 1. Remove ANY leading whitespace from lines starting with '#'
-        fixed_content = re.sub(r'^[ \t]+#', '#', d.page_content, flags=re.MULTILINE)
-        
-        # 2. Ensure there is a newline BEFORE every '##' so the splitter sees it
-        fixed_content = re.sub(r'(##+)', r'\n\1', fixed_content)
-        
-        # 3. Ensure there is a space AFTER the '#' symbols (e.g., '##Header' -> '## Header')
-        fixed_content = re.sub(r'^(#+)([^#\s])', r'\1 \2', fixed_content, flags=re.MULTILINE)
+        # un-indent '#' lines, put every '##' on its own line, add a space after '#'s
+        fixed_content = text_normalize.fix_md_headers(d.page_content)
 
         sections = splitter.split_text(fixed_content)
         # Split text into header-based chunks
@@ -205,8 +731,12 @@ def split_by_md (docs:List[Document])-> List[Document]:
                 "source": d.metadata["source"],
                 "filename": d.metadata["filename"],
                 "doc_id": d.metadata["doc_id"],
+                # content hash of the document: chunk ids and dataset filters key on it
+                **({"doc_hash": d.metadata["doc_hash"]} if "doc_hash" in d.metadata else {}),
                 **s.metadata # Adds h1, h2, h3
             }
+            # header-path id used by the section router
+            s.metadata["section_id"] = section_key(s.metadata)
         
         out.extend(sections)
     
@@ -240,60 +770,133 @@ def cap_chunk_size(docs: List[Document]) -> List[Document]:
 
 
 # Embedding and Vectorization
-def embed_vectorize(chunks: List[Document],persist_dir: Path,force_rebuild:bool=False):
+def embed_vectorize(
+    chunks: List[Document],
+    persist_dir: Path,
+    force_rebuild: bool = False,
+    ids: Optional[List[str]] = None,
+    delete_ids: Optional[List[str]] = None,
+    doc_hashes: Optional[List[str]] = None,
+    retrieval_mode: Optional[str] = None,
+):
     """
     Embeds document chunks into vectors, stores them in Chroma database, and returns a reranking retriever for efficient, high-quality retrieval.
 
     This function handles vector database creation/loading, embedding generation, and retriever setup with cross-encoder reranking to improve relevance.
 
     Args:
-        chunks: List of Document chunks to embed and store.
-        force_rebuild: If True, rebuilds the vector database from scratch.
+        chunks: List of Document chunks to embed and store (upserted by ids when given).
+        force_rebuild: If True, builds a fresh index version from chunks and swaps it in
+            (blue/green; the previous version serves until then). Chunks need doc_hash
+            metadata (split_by_md); they get the same ids and manifest as build_retriever.
+        delete_ids: Chunk ids to remove from the collection first (stale documents).
+        doc_hashes: Restrict retrieval to chunks of these documents (None = whole collection).
+        retrieval_mode: "fixed" (k=20 -> rerank all -> top 5) or "adaptive"
+            (score-gap candidate depth + early-exit staged reranking). Default RETRIEVAL_MODE.
 
     Returns:
-        ContextualCompressionRetriever for retrieving relevant documents with reranking.
+        Pooled reranking retriever over persist_dir (release with release_retriever()).
     """
     
-    # rebuild only this dataset’s folder
-    if force_rebuild and persist_dir.exists():
-        print(f"Force-Rebuilding Vector DB at {persist_dir}")
-        shutil.rmtree(persist_dir)
-
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large:latest")
-    persist_dir_str = str(persist_dir)
-
-    
-    # load/build using persist_dir (NOT CHROMA_DIR)
-    if persist_dir.exists() and any(persist_dir.iterdir()):
-        print(f"--- Loading existing Vector Store from {persist_dir_str} ---")
-        db = Chroma(
-            persist_directory=persist_dir_str,
-            embedding_function=embeddings,
-            collection_name=COLLECTION,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
+    slot = Path(persist_dir)
+    if force_rebuild:
+        # build next to the live version, swap when done (nothing is removed before that)
+        staged = new_version_dir(slot)
+        print(f"Force-Rebuilding Vector DB into {staged}")
+        _BUILDING.add(str(staged))
+        try:
+            _index_rebuilt_chunks(chunks, staged)
+            with _slot_lock(slot):
+                _carry_over(live_index_dir(slot), staged, {})
+                swap_index(slot, staged)
+        except Exception:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+        finally:
+            _BUILDING.discard(str(staged))
     else:
-        print(f"--- Vector Store not found. Building new index at {persist_dir_str} ---")
-        persist_dir.mkdir(parents=True, exist_ok=True)
-        db = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            collection_name=COLLECTION,
-            persist_directory=persist_dir_str,
-            collection_metadata={"hnsw:space": "cosine"}
+        with _slot_lock(slot):
+            index_chunks(chunks, live_index_dir(slot), ids=ids, delete_ids=delete_ids)
+
+    return _acquire_live(slot, doc_hashes, retrieval_mode, cache_results=False)
+
+
+def _index_rebuilt_chunks(chunks: List[Document], staged: Path) -> None:
+    """Indexes chunks into a fresh version with stable <doc_hash>:<n> ids and writes its manifest."""
+    if any("doc_hash" not in c.metadata for c in chunks):
+        raise ValueError("force_rebuild needs chunks with doc_hash metadata (see split_by_md)")
+    counts: Dict[str, int] = {}
+    docs: Dict[str, str] = {}
+    ids: List[str] = []
+    for c in chunks:
+        h = c.metadata["doc_hash"]
+        ids.append(f"{h}:{counts.get(h, 0)}")
+        counts[h] = counts.get(h, 0) + 1
+        docs.setdefault(c.metadata["doc_id"], h)
+    index_chunks(chunks, staged, ids=ids)
+    hashes = sorted(counts)
+    _save_manifest(staged, {"docs": docs, "chunks": counts, "datasets": {dataset_id(hashes): hashes}})
+
+
+def index_chunks(
+    chunks: List[Document],
+    persist_dir: Path,
+    ids: Optional[List[str]] = None,
+    delete_ids: Optional[List[str]] = None,
+    vectors: Optional[List[List[float]]] = None,
+) -> None:
+    """
+    Deletes delete_ids, then upserts chunks into the (pooled) Chroma store at persist_dir.
+    Chunks are embedded here unless their vectors were computed beforehand.
+    """
+    if not chunks and not delete_ids:
+        return
+    with chroma_collection(persist_dir) as db:
+        if delete_ids:
+            db.delete(ids=delete_ids)
+            print(f"Removed {len(delete_ids)} stale chunks.")
+
+        if chunks:
+            ids = ids or [str(uuid.uuid4()) for _ in chunks]
+            if vectors is not None:
+                EmbeddingExecutor.upsert(db._collection, chunks, ids, vectors)
+                print(f"Successfully stored {len(chunks)} chunks.")
+                return
+            # batched + concurrent, vectors go straight into the collection
+            stats = EmbeddingExecutor(get_embeddings()).index(db._collection, chunks, ids)
+            print(f"Successfully vectorized {len(chunks)} chunks ({stats['chunks_per_s']} chunks/s).")
+
+
+def _make_retriever(store, search_kwargs: Dict, retrieval_mode: Optional[str] = None, router: Optional[SectionRouter] = None):
+    """
+    Dense search over store (Chroma or ExactVectorStore) + cross-encoder reranking to the top 5.
+    With a router, each query's dense search is first restricted to its matching sections.
+    """
+    if (retrieval_mode or RETRIEVAL_MODE) == "adaptive":
+        return AdaptiveRerankRetriever(
+            vectorstore=store,
+            cross_encoder=RERANK_BATCHER,
+            top_n=5,
+            max_k=search_kwargs["k"],
+            search_filter=search_kwargs.get("filter"),
+            router=router,
         )
-        print(f"Successfully vectorized {len(chunks)} chunks.")
 
     # Create Base Retriever (The "Wide Net")
     # We fetch 20 documents instead of 5 to ensure we don't miss anything.
-    base_retriever = db.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 20} 
-    )
+    if router is not None:
+        base_retriever = RoutedVectorRetriever(
+            vectorstore=store, router=router, k=search_kwargs["k"], base_filter=search_kwargs.get("filter")
+        )
+    else:
+        base_retriever = store.as_retriever(
+            search_type="similarity",
+            search_kwargs=search_kwargs
+        )
 
     
     # We tell it to pick the Top 5 winners from the 20 candidates
-    compressor = CrossEncoderReranker(model=GLOBAL_RERANKER_MODEL, top_n=5)
+    compressor = CrossEncoderReranker(model=RERANK_BATCHER, top_n=5)
 
     # Create Compression Retriever 
     # This wraps the base retriever. When you call .invoke(), it does the 2-step process automatically.
@@ -302,4 +905,4 @@ def embed_vectorize(chunks: List[Document],persist_dir: Path,force_rebuild:bool=
         base_retriever=base_retriever
     )
     
-    return compression_retriever
\ No newline at end of file
+    return compression_retriever